@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from rest_framework.serializers import BaseSerializer
+
+        from api import signals  # noqa: F401
+        from api.middleware import timed_data
+
+        # Serializer.data и ListSerializer.data вызывают BaseSerializer.data,
+        # поэтому так учитываются все сериализаторы, в том числе из djoser
+        BaseSerializer.data = timed_data(BaseSerializer.data)
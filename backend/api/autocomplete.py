@@ -0,0 +1,94 @@
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+
+from api.cache import get_ingredients_version
+from api.constants import INGREDIENT_SEARCH_LIMIT
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса: названия в нижнем регистре
+    отсортированы, префиксный поиск — бинарный, затем подстроки.
+    """
+
+    def __init__(self, rows, version=None):
+        entries = sorted(
+            (row['name'].casefold(), row['id'], row) for row in rows
+        )
+        self.version = version
+        self._keys = [key for key, _, _ in entries]
+        self._rows = [row for _, _, row in entries]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        query = query.strip().casefold()
+        if not query:
+            return self._rows[:limit]
+        keys = self._keys
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        results = self._rows[start:min(end, start + limit)]
+        if len(results) < limit:
+            for position, key in enumerate(keys):
+                if query in key and not start <= position < end:
+                    results.append(self._rows[position])
+                    if len(results) == limit:
+                        break
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_ingredient_index():
+    """Возвращает индекс, перестраивая его после изменения ингредиентов."""
+    global _index
+    version = get_ingredients_version()
+    index = _index
+    if index is None or index.version != version:
+        with _index_lock:
+            index = _index
+            if index is None or index.version != version:
+                index = IngredientIndex(
+                    Ingredient.objects.values(
+                        'id', 'name', 'measurement_unit'
+                    ),
+                    version
+                )
+                _index = index
+    return index
+
+
+def search_ingredients_db(query, limit=INGREDIENT_SEARCH_LIMIT):
+    """
+    Тот же порядок средствами БД: сначала совпадения в начале названия.
+    В PostgreSQL icontains использует триграммный индекс по UPPER(name).
+    """
+    return list(
+        Ingredient.objects.filter(
+            name__icontains=query
+        ).annotate(
+            rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('rank', 'name').values(
+            'id', 'name', 'measurement_unit'
+        )[:limit]
+    )
+
+
+def search_ingredients(query, limit=INGREDIENT_SEARCH_LIMIT):
+    if settings.INGREDIENT_SEARCH_INDEX:
+        return get_ingredient_index().search(query, limit)
+    return search_ingredients_db(query.strip(), limit)
@@ -0,0 +1,129 @@
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models import Count
+
+from api.metrics import registry
+
+TAG_UNIVERSE_KEY = 'api:tag_universe'
+CATALOG_VERSION_KEY = 'api:catalog_version'
+INGREDIENTS_VERSION_KEY = 'api:ingredients_version'
+TAGS_VERSION_KEY = 'api:tags_version'
+CART_VERSION_KEY = 'api:cart_version:{}'
+RESPONSE_CACHE_PREFIX = 'api:response'
+
+# Версии и набор тегов живут в отдельном кэше: вытеснение ответов
+# из основного кэша их не затрагивает
+versions = caches['versions']
+
+
+def get_tag_universe():
+    """
+    Слаги тегов, у которых есть хотя бы один рецепт,
+    с количеством рецептов по каждому тегу.
+    """
+    universe = versions.get(TAG_UNIVERSE_KEY)
+    if universe is None:
+        from recipes.models import Tag
+
+        universe = dict(
+            Tag.objects.annotate(
+                recipes_count=Count('recipe')
+            ).filter(
+                recipes_count__gt=0
+            ).order_by().values_list('slug', 'recipes_count')
+        )
+        versions.set(TAG_UNIVERSE_KEY, universe, None)
+    return universe
+
+
+def invalidate_tag_universe():
+    versions.delete(TAG_UNIVERSE_KEY)
+
+
+def _incr(key, initial):
+    """Увеличивает счётчик в кэше, создавая его при отсутствии."""
+    try:
+        return versions.incr(key)
+    except ValueError:
+        versions.add(key, initial, None)
+        return versions.get(key, initial)
+
+
+def _get_version(key):
+    """
+    Версия набора данных. Начальное значение берётся из часов,
+    чтобы после вытеснения ключа версия не совпала со старой.
+    """
+    version = versions.get(key)
+    if version is None:
+        versions.add(key, time.time_ns(), None)
+        version = versions.get(key)
+    return version
+
+
+def get_catalog_version():
+    """Глобальная версия каталога рецептов."""
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return _incr(CATALOG_VERSION_KEY, time.time_ns())
+
+
+def get_ingredients_version():
+    return _get_version(INGREDIENTS_VERSION_KEY)
+
+
+def bump_ingredients_version():
+    return _incr(INGREDIENTS_VERSION_KEY, time.time_ns())
+
+
+def get_tags_version():
+    return _get_version(TAGS_VERSION_KEY)
+
+
+def bump_tags_version():
+    return _incr(TAGS_VERSION_KEY, time.time_ns())
+
+
+def get_cart_version(user_id):
+    """Версия корзины пользователя."""
+    return _get_version(CART_VERSION_KEY.format(user_id))
+
+
+def bump_cart_version(user_id):
+    return _incr(CART_VERSION_KEY.format(user_id), time.time_ns())
+
+
+def response_cache_key(request, scope):
+    """Ключ ответа: версия каталога, хост, путь и отсортированный query."""
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    return ':'.join((
+        RESPONSE_CACHE_PREFIX,
+        scope,
+        str(get_catalog_version()),
+        request.get_host(),
+        request.path,
+        urlencode(params),
+    ))
+
+
+def get_cached_response(key):
+    """Ответ из кэша или None; попадания считаются в метриках процесса."""
+    data = cache.get(key)
+    if settings.METRICS_ENABLED:
+        registry.increment(
+            'response_cache_total', 'miss' if data is None else 'hit'
+        )
+    return data
+
+
+def set_cached_response(key, data):
+    cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
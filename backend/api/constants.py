@@ -11,3 +11,24 @@ MAX_COOKING_TIME = 32000
 ALLOWED_IMAGE_FORMATS = [
     'image/jpeg', 'image/jpg', 'image/png', 'image/gif'
 ]
+
+# Максимум ингредиентов в ответе автодополнения
+INGREDIENT_SEARCH_LIMIT = 50
+
+# Размер пачки строк при потоковой выгрузке списка покупок
+SHOPPING_LIST_CHUNK_SIZE = 2000
+
+# Рецептов автора в подписках: по умолчанию и максимум (recipes_limit)
+DEFAULT_RECIPES_LIMIT = 3
+MAX_RECIPES_LIMIT = 50
+
+# Лента подписок: до FEED_FANOUT_SYNC_FOLLOWERS подписчиков рецепт
+# раскладывается по лентам сразу, до FEED_FANOUT_MAX_FOLLOWERS — в фоне,
+# рецепты более популярных авторов подмешиваются при чтении.
+FEED_FANOUT_SYNC_FOLLOWERS = 100
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+# Сколько последних рецептов автора попадает в ленту при подписке
+FEED_BACKFILL_RECIPES = 50
+
+# Максимум рецептов в одном пакетном запросе к избранному и корзине
+MAX_BULK_RECIPES = 100
@@ -0,0 +1,128 @@
+"""
+Быстрый путь чтения рецептов: тот же JSON, что у RecipeReadSerializer,
+но собранный из нескольких .values()-запросов без моделей и вложенных
+сериализаторов. Паритет с RecipeReadSerializer проверяется тестом.
+"""
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+from recipes.images import image_set
+from recipes.models import Recipe, RecipeIngredient
+from users.models import is_subscribed_annotation
+
+User = get_user_model()
+
+RECIPE_VALUES = (
+    'id', 'author_id', 'name', 'image', 'image_variants', 'text',
+    'cooking_time', 'pub_date', 'is_favorited', 'is_in_shopping_cart',
+)
+AUTHOR_VALUES = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'avatar',
+    'avatar_variants',
+)
+
+_datetime_field = serializers.DateTimeField()
+
+
+def recipe_rows(queryset, *extra):
+    """
+    Строки рецептов для быстрого пути (queryset с with_user_flags).
+    extra — дополнительные поля, например ключ курсорной пагинации.
+    """
+    return queryset.prefetch_related(None).values(*RECIPE_VALUES, *extra)
+
+
+def _file_url(storage, name, request):
+    if not name:
+        return None
+    url = storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _authors(author_ids, request):
+    storage = User._meta.get_field('avatar').storage
+    authors = {}
+    for row in User.objects.filter(pk__in=author_ids).annotate(
+        is_subscribed=is_subscribed_annotation(request.user)
+    ).values(*AUTHOR_VALUES, 'is_subscribed'):
+        authors[row['id']] = {
+            'id': row['id'],
+            'email': row['email'],
+            'username': row['username'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'avatar': _file_url(storage, row['avatar'], request),
+            'avatar_set': image_set(
+                storage, row['avatar'], row['avatar_variants'], request
+            ),
+            'is_subscribed': row['is_subscribed'],
+        }
+    return authors
+
+
+def _tags(recipe_ids):
+    tags = defaultdict(list)
+    for row in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('tag__name').values(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+    ):
+        tags[row['recipe_id']].append({
+            'id': row['tag_id'],
+            'name': row['tag__name'],
+            'color': row['tag__color'],
+            'slug': row['tag__slug'],
+        })
+    return tags
+
+
+def _ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    for row in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('pk').values(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount'
+    ):
+        ingredients[row['recipe_id']].append({
+            'id': row['ingredient_id'],
+            'name': row['ingredient__name'],
+            'measurement_unit': row['ingredient__measurement_unit'],
+            'amount': row['amount'],
+        })
+    return ingredients
+
+
+def serialize_recipe_rows(rows, request):
+    """Собирает представления рецептов из строк recipe_rows()."""
+    rows = list(rows)
+    if not rows:
+        return []
+    recipe_ids = [row['id'] for row in rows]
+    authors = _authors({row['author_id'] for row in rows}, request)
+    tags = _tags(recipe_ids)
+    ingredients = _ingredients(recipe_ids)
+    storage = Recipe._meta.get_field('image').storage
+    return [
+        {
+            'id': row['id'],
+            'author': authors[row['author_id']],
+            'tags': tags[row['id']],
+            'ingredients': ingredients[row['id']],
+            'is_favorited': row['is_favorited'],
+            'is_in_shopping_cart': row['is_in_shopping_cart'],
+            'name': row['name'],
+            'image': _file_url(storage, row['image'], request),
+            'image_set': image_set(
+                storage, row['image'], row['image_variants'], request
+            ),
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+            'pub_date': _datetime_field.to_representation(row['pub_date']),
+        }
+        for row in rows
+    ]
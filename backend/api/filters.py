@@ -1,6 +1,8 @@
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe
+from api.cache import get_tag_universe
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
 
 
 class IngredientFilter(filters.FilterSet):
@@ -15,32 +17,33 @@ class IngredientFilter(filters.FilterSet):
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.AllValuesMultipleFilter(
+    tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
         method='filter_tags'
     )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart', 'search'
+        ]
 
     def filter_tags(self, queryset, name, value):
         if not value:
             return queryset
 
-        all_tags = list(
-            Recipe.objects.values_list('tags__slug', flat=True).distinct()
-        )
-        all_tags = [tag for tag in all_tags if tag is not None]
-
-        if set(value) == set(all_tags):
+        slugs = {tag.slug for tag in value}
+        if slugs == get_tag_universe().keys():
             return queryset
 
-        return queryset.filter(tags__slug__in=value).distinct()
+        return queryset.filter(tags__slug__in=slugs).distinct()
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -51,3 +54,6 @@ class RecipeFilter(filters.FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(in_shopping_carts__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
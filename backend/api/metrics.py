@@ -0,0 +1,194 @@
+"""
+Метрики запросов: число и гистограммы задержки и SQL-запросов по вью.
+
+Каждый процесс gunicorn копит метрики в памяти и раз в
+METRICS_FLUSH_INTERVAL секунд записывает их в свой файл
+METRICS_DIR/<pid>.json; /api/metrics складывает все файлы каталога.
+Файлы завершившихся процессов остаются, чтобы счётчики не убывали,
+поэтому каталог должен очищаться при перезапуске контейнера.
+"""
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+PREFIX = 'foodgram'
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        LATENCY_BUCKETS, 'Время обработки запроса'
+    ),
+    'http_request_queries': (QUERY_BUCKETS, 'SQL-запросов за запрос'),
+    'http_request_db_seconds': (LATENCY_BUCKETS, 'Время SQL за запрос'),
+}
+COUNTERS = {
+    'http_requests_total': 'Число запросов',
+    'response_cache_total': 'Кэш ответов анонимным пользователям',
+}
+LABELS = {
+    'http_requests_total': ('view', 'method', 'status'),
+    'response_cache_total': ('result',),
+}
+HISTOGRAM_LABELS = ('view', 'method')
+SEPARATOR = '\t'
+
+
+class MetricsRegistry:
+    """Метрики одного процесса и их периодическая запись в файл."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.flushed_at = 0
+        self.reset()
+
+    def reset(self):
+        self.data = {'counters': {}, 'histograms': {}}
+
+    def _own(self):
+        if self.pid != os.getpid():
+            # Процесс создан fork после импорта: чужие данные не берём
+            self.pid = os.getpid()
+            self.reset()
+
+    def _count(self, name, *labels):
+        counters = self.data['counters'].setdefault(name, {})
+        key = SEPARATOR.join(map(str, labels))
+        counters[key] = counters.get(key, 0) + 1
+
+    def _flush_due(self):
+        if time.monotonic() - self.flushed_at >= (
+            settings.METRICS_FLUSH_INTERVAL
+        ):
+            self._flush()
+
+    def increment(self, name, *labels):
+        """Счётчик name из COUNTERS со значениями меток LABELS[name]."""
+        with self.lock:
+            self._own()
+            self._count(name, *labels)
+            self._flush_due()
+
+    def observe(self, view, method, status, duration, queries, db_time):
+        labels = SEPARATOR.join((view, method))
+        with self.lock:
+            self._own()
+            self._count('http_requests_total', view, method, status)
+            for name, value in (
+                ('http_request_duration_seconds', duration),
+                ('http_request_queries', queries),
+                ('http_request_db_seconds', db_time),
+            ):
+                buckets = HISTOGRAMS[name][0]
+                series = self.data['histograms'].setdefault(
+                    name, {}
+                ).setdefault(labels, {
+                    'buckets': [0] * (len(buckets) + 1), 'sum': 0, 'count': 0
+                })
+                series['buckets'][bisect_left(buckets, value)] += 1
+                series['sum'] += value
+                series['count'] += 1
+            self._flush_due()
+
+    def flush(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                self._flush()
+
+    def _flush(self):
+        """Атомарно переписывает файл процесса."""
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        descriptor, path = tempfile.mkstemp(
+            dir=settings.METRICS_DIR, suffix='.tmp'
+        )
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(self.data, file)
+        os.replace(
+            path, os.path.join(settings.METRICS_DIR, f'{self.pid}.json')
+        )
+        self.flushed_at = time.monotonic()
+
+
+registry = MetricsRegistry()
+
+
+def collect():
+    """Сумма метрик всех процессов из файлов METRICS_DIR."""
+    registry.flush()
+    total = {'counters': {}, 'histograms': {}}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, series in data['counters'].items():
+            target = total['counters'].setdefault(name, {})
+            for key, value in series.items():
+                target[key] = target.get(key, 0) + value
+        for name, series in data['histograms'].items():
+            target = total['histograms'].setdefault(name, {})
+            for key, value in series.items():
+                merged = target.setdefault(key, {
+                    'buckets': [0] * len(value['buckets']),
+                    'sum': 0, 'count': 0
+                })
+                merged['buckets'] = [
+                    a + b for a, b in zip(merged['buckets'], value['buckets'])
+                ]
+                merged['sum'] += value['sum']
+                merged['count'] += value['count']
+    return total
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+        )
+        for name, value in pairs
+    ) + '}'
+
+
+def render_prometheus(data):
+    """Текстовый формат Prometheus 0.0.4."""
+    lines = []
+    for name, help_text in COUNTERS.items():
+        metric = f'{PREFIX}_{name}'
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for key, value in sorted(data['counters'].get(name, {}).items()):
+            lines.append(
+                f'{metric}{_labels(LABELS[name], key.split(SEPARATOR))} '
+                f'{value}'
+            )
+    for name, (buckets, help_text) in HISTOGRAMS.items():
+        metric = f'{PREFIX}_{name}'
+        lines += [
+            f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram'
+        ]
+        for key, series in sorted(data['histograms'].get(name, {}).items()):
+            values = key.split(SEPARATOR)
+            cumulative = 0
+            for bound, count in zip(
+                (*map(str, buckets), '+Inf'), series['buckets']
+            ):
+                cumulative += count
+                lines.append(
+                    f'{metric}_bucket'
+                    f'{_labels(HISTOGRAM_LABELS, values, le=bound)} '
+                    f'{cumulative}'
+                )
+            labels = _labels(HISTOGRAM_LABELS, values)
+            lines.append(f'{metric}_sum{labels} {series["sum"]}')
+            lines.append(f'{metric}_count{labels} {series["count"]}')
+    return '\n'.join(lines) + '\n'
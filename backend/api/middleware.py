@@ -0,0 +1,145 @@
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from api.metrics import registry
+from api.nplusone import NPlusOneDetector
+
+
+class QueryTimer:
+    """
+    execute_wrapper: число SQL-запросов и суммарное время на них.
+    Заодно копит время сериализации ответа (serializer.data).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+        self.serialize_seconds = 0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+    @contextmanager
+    def serialization(self):
+        """
+        Время сериализации без SQL-запросов, выполненных по ходу (ленивые
+        queryset'ы) — они уже учтены в db. Вложенные serializer.data
+        не считаются повторно.
+        """
+        if self.serializing:
+            yield
+            return
+        self.serializing = True
+        started, db_seconds = time.perf_counter(), self.seconds
+        try:
+            yield
+        finally:
+            self.serialize_seconds += (
+                time.perf_counter() - started - (self.seconds - db_seconds)
+            )
+            self.serializing = False
+
+
+current_timer = ContextVar('current_timer', default=None)
+
+
+def timed_data(data):
+    """Обёртка BaseSerializer.data для колонки serialize в Server-Timing."""
+
+    def wrapper(serializer):
+        timer = current_timer.get()
+        if timer is None:
+            return data.fget(serializer)
+        with timer.serialization():
+            return data.fget(serializer)
+
+    return property(wrapper)
+
+
+class RequestMetricsMiddleware:
+    """
+    Считает SQL-запросы и время запроса, сериализации, рендеринга ответа
+    и SQL, пишет их в заголовок Server-Timing и в метрики /api/metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        timer = QueryTimer()
+        request._render_seconds = 0
+        started = time.perf_counter()
+        token = current_timer.set(timer)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match else 'unmatched',
+            request.method, response.status_code,
+            duration, timer.count, timer.seconds
+        )
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={timer.seconds * 1000:.1f};'
+                f'desc="{timer.count} queries"',
+                f'serialize;dur={timer.serialize_seconds * 1000:.1f}',
+                f'render;dur={request._render_seconds * 1000:.1f}',
+                f'total;dur={duration * 1000:.1f}',
+            ))
+        return response
+
+    def process_template_response(self, request, response):
+        """DRF рендерит ответ сразу после этого хука."""
+        if not hasattr(request, '_render_seconds'):
+            return response
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._render_seconds += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class NPlusOneMiddleware:
+    """
+    Ищет повторяющиеся SQL-запросы (api.nplusone). В режиме 'log'
+    проверяется доля запросов NPLUSONE_SAMPLE_RATE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = settings.NPLUSONE_MODE
+        if mode == 'off' or (
+            mode == 'log' and random.random() >= settings.NPLUSONE_SAMPLE_RATE
+        ):
+            return self.get_response(request)
+        detector = NPlusOneDetector(
+            settings.NPLUSONE_THRESHOLD, mode,
+            f'{request.method} {request.path}'
+        )
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(detector))
+            return self.get_response(request)
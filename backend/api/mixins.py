@@ -0,0 +1,85 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.cache import (
+    get_cached_response, response_cache_key, set_cached_response,
+)
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Кэширует ответы list и retrieve для анонимных пользователей.
+    Ключ включает версию каталога, поэтому после любой записи
+    в рецепты, теги, ингредиенты или авторов кэш не отдаёт старые данные.
+    """
+    response_cache_scope = None
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        key = response_cache_key(request, self.response_cache_scope)
+        data = get_cached_response(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_cached_response(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalListMixin:
+    """
+    Условный GET для справочников: list отдаёт сильный ETag и
+    Cache-Control, а на совпавший If-None-Match отвечает 304
+    без загрузки строк и сериализации.
+    Версия данных — счётчик изменений из сигналов плюс max(id)
+    и количество строк (ловит bulk_create без сигналов).
+    """
+    data_version = None
+
+    def get_list_etag(self, request):
+        model = self.get_queryset().model
+        stats = model.objects.aggregate(max_id=Max('pk'), total=Count('pk'))
+        token = ':'.join(str(part) for part in (
+            self.data_version(),
+            stats['max_id'],
+            stats['total'],
+            request.accepted_renderer.format,
+            request.get_full_path(),
+        ))
+        return quote_etag(hashlib.sha1(token.encode()).hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_list_etag(request)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = self.get_list_response(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'public, max-age={settings.REFERENCE_DATA_MAX_AGE}'
+        )
+        return response
+
+    def get_list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,93 @@
+"""
+Поиск N+1: один и тот же SQL (с точностью до параметров) повторяется
+за запрос больше NPLUSONE_THRESHOLD раз.
+
+Режимы NPLUSONE_MODE: 'raise' (тесты, см. pytest.ini) — исключение
+NPlusOneError; 'log' — предупреждение с местом вызова в коде проекта
+для доли запросов NPLUSONE_SAMPLE_RATE; 'off'. Намеренные циклы
+оборачиваются в allow_nplusone().
+"""
+import logging
+import os
+import re
+import threading
+import traceback
+from contextlib import ContextDecorator
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+# Файлы, кадры которых не считаются местом вызова
+SKIP_FILES = (__file__, os.path.join('api', 'middleware.py'))
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """SQL без значений: литералы — %s, списки IN (%s, ...) — IN (...)."""
+    sql = NUMBER_RE.sub('%s', STRING_RE.sub('%s', sql))
+    return SPACE_RE.sub(' ', IN_LIST_RE.sub('IN (...)', sql)).strip()
+
+
+class allow_nplusone(ContextDecorator):
+    """Запросы внутри блока или функции детектор не считает."""
+
+    def __enter__(self):
+        _state.allowed = getattr(_state, 'allowed', 0) + 1
+        return self
+
+    def __exit__(self, *exc):
+        _state.allowed -= 1
+        return False
+
+
+def _origin():
+    """Ближайший к запросу кадр кода проекта."""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        filename = os.path.abspath(frame.filename)
+        if (
+            filename.startswith(str(settings.BASE_DIR))
+            and 'site-packages' not in filename
+            and not filename.endswith(SKIP_FILES)
+        ):
+            return f'{frame.filename}:{frame.lineno} in {frame.name}'
+    return 'неизвестно'
+
+
+class NPlusOneDetector:
+    """execute_wrapper: считает повторы SQL за один запрос."""
+
+    def __init__(self, threshold, mode, label=''):
+        self.threshold = threshold
+        self.mode = mode
+        self.label = label
+        self.counts = {}
+        self.reported = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not getattr(_state, 'allowed', 0):
+            self.check(sql)
+        return execute(sql, params, many, context)
+
+    def check(self, sql):
+        key = fingerprint(sql)
+        count = self.counts[key] = self.counts.get(key, 0) + 1
+        if count <= self.threshold or key in self.reported:
+            return
+        self.reported.add(key)
+        message = (
+            f'N+1 {self.label}: запрос повторён {count} раз, '
+            f'вызван из {_origin()}: {key}'
+        )
+        if self.mode == 'raise':
+            raise NPlusOneError(message)
+        logger.warning(message)
@@ -1,6 +1,50 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная пагинация по (pub_date, id): без COUNT(*) и OFFSET,
+    ссылки next/previous содержат непрозрачный курсор.
+    Вьюсет может задать свой порядок атрибутом cursor_ordering.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с переключением на курсорную:
+    по параметру ?pagination=cursor (или наличию ?cursor=)
+    либо для вьюсетов с cursor_pagination = True.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+
+    keyset = None
+
+    def use_cursor(self, request, view):
+        return (
+            getattr(view, 'cursor_pagination', False)
+            or request.query_params.get(
+                self.mode_query_param
+            ) == self.cursor_mode
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request, view):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
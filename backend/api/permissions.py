@@ -1,3 +1,6 @@
+import ipaddress
+
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -50,3 +53,32 @@ class IsAuthorOrAdminOrReadOnly(permissions.BasePermission):
             or obj.author == request.user
             or request.user.is_staff
         )
+
+
+def _client_ip(request):
+    """
+    Адрес клиента. X-Real-IP ставит nginx, поэтому заголовку верим, только
+    если соединение пришло из внутренней сети.
+    """
+    remote = request.META.get('REMOTE_ADDR', '')
+    if not _is_internal(remote):
+        return remote
+    return request.META.get('HTTP_X_REAL_IP', remote)
+
+
+def _is_internal(address):
+    try:
+        ip = ipaddress.ip_address(address.strip())
+    except ValueError:
+        return False
+    return any(
+        ip in ipaddress.ip_network(network.strip())
+        for network in settings.METRICS_INTERNAL_NETWORKS
+    )
+
+
+class IsStaffOrInternalIP(permissions.BasePermission):
+    """Доступ staff-пользователям и запросам из внутренних сетей."""
+
+    def has_permission(self, request, view):
+        return request.user.is_staff or _is_internal(_client_ip(request))
@@ -1,13 +1,17 @@
 import django.contrib.auth.password_validation as validators
 from django.contrib.auth import authenticate, get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import transaction
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
 from api.constants import (
-    ALLOWED_IMAGE_FORMATS, MAX_AMOUNT, MAX_COOKING_TIME,
-    MAX_IMAGE_SIZE, MIN_AMOUNT, MIN_COOKING_TIME,
+    ALLOWED_IMAGE_FORMATS, DEFAULT_RECIPES_LIMIT, MAX_AMOUNT,
+    MAX_BULK_RECIPES, MAX_COOKING_TIME, MAX_IMAGE_SIZE, MAX_RECIPES_LIMIT,
+    MIN_AMOUNT, MIN_COOKING_TIME,
 )
+from api.fast_read import serialize_recipe_rows
+from recipes.images import image_set
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from users.models import Subscription
 
@@ -43,13 +47,20 @@ class UserListSerializer(serializers.ModelSerializer):
     """Сериализатор для списка пользователей."""
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False)
+    avatar_set = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = (
             'id', 'email', 'username',
             'first_name', 'last_name',
-            'avatar', 'is_subscribed'
+            'avatar', 'avatar_set', 'is_subscribed'
+        )
+
+    def get_avatar_set(self, obj):
+        return image_set(
+            obj.avatar.storage, obj.avatar.name, obj.avatar_variants,
+            self.context.get('request')
         )
 
     def validate_avatar(self, value):
@@ -70,10 +81,13 @@ class UserListSerializer(serializers.ModelSerializer):
         return value
 
     def get_is_subscribed(self, obj):
+        annotated = getattr(obj, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
-        return user.following.filter(author=obj).exists()
+        return user.follower.filter(author=obj).exists()
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -116,6 +130,13 @@ def _validate_unique_ingredients(ingredients):
         seen.add(iid)
 
 
+def recipe_image_set(recipe, context):
+    return image_set(
+        recipe.image.storage, recipe.image.name, recipe.image_variants,
+        context.get('request')
+    )
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для тегов."""
     class Meta:
@@ -131,10 +152,11 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class IngredientWriteSerializer(serializers.Serializer):
-    """Сериализатор для добавления ингредиента в рецепт."""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    """
+    Сериализатор для добавления ингредиента в рецепт. Ингредиенты по id
+    загружает RecipeWriteSerializer одним запросом на весь список.
+    """
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         validators=[
             MinValueValidator(MIN_AMOUNT),
@@ -204,6 +226,24 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 )
         return value
 
+    def validate_ingredients(self, ingredients):
+        found = Ingredient.objects.in_bulk(
+            {item['id'] for item in ingredients}
+        )
+        message = serializers.PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist'
+        ]
+        errors = [
+            {} if item['id'] in found
+            else {'id': [message.format(pk_value=item['id'])]}
+            for item in ingredients
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors, code='does_not_exist')
+        return [
+            {**item, 'id': found[item['id']]} for item in ingredients
+        ]
+
     def validate(self, data):
         ingredients = data.get('ingredients', [])
         if not ingredients:
@@ -225,6 +265,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredient.objects.bulk_create(objs)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -233,6 +274,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         self._bulk_create_ingredients(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if 'ingredients' in validated_data:
             instance.ingredients.clear()
@@ -255,12 +297,23 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_set = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        fields = (
+            'id', 'author', 'tags', 'ingredients',
+            'is_favorited', 'is_in_shopping_cart',
+            'name', 'image', 'image_set', 'text', 'cooking_time', 'pub_date'
+        )
+
+    def get_image_set(self, obj):
+        return recipe_image_set(obj, self.context)
 
     def get_is_favorited(self, obj):
+        annotated = getattr(obj, 'is_favorited', None)
+        if annotated is not None:
+            return annotated
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -270,6 +323,9 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        annotated = getattr(obj, 'is_in_shopping_cart', None)
+        if annotated is not None:
+            return annotated
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -279,14 +335,60 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeRowsListSerializer(serializers.ListSerializer):
+    """Собирает всю страницу рецептов за несколько запросов."""
+
+    def to_representation(self, data):
+        return serialize_recipe_rows(data, self.context['request'])
+
+
+class RecipeRowsSerializer(serializers.BaseSerializer):
+    """
+    Чтение рецептов из строк .values() (см. api.fast_read):
+    тот же ответ, что у RecipeReadSerializer, без моделей
+    и вложенных сериализаторов.
+    """
+
+    class Meta:
+        list_serializer_class = RecipeRowsListSerializer
+
+    def to_representation(self, instance):
+        return serialize_recipe_rows([instance], self.context['request'])[0]
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    """Проверка параметра recipes_limit; значение ограничено сверху."""
+    recipes_limit = serializers.IntegerField(
+        min_value=0,
+        default=DEFAULT_RECIPES_LIMIT
+    )
+
+    @classmethod
+    def from_request(cls, request):
+        serializer = cls(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return min(
+            serializer.validated_data['recipes_limit'], MAX_RECIPES_LIMIT
+        )
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных запросов; повторы отбрасываются."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
 class UserWithRecipesSerializer(serializers.ModelSerializer):
     """Сериализатор для пользователя с рецептами в подписках."""
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count',
-        read_only=True
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -298,18 +400,25 @@ class UserWithRecipesSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        annotated = getattr(obj, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
-        return user.following.filter(author=obj).exists()
+        return user.follower.filter(author=obj).exists()
 
     def get_recipes(self, obj):
-        limit = self.context['request'].GET.get('recipes_limit', 3)
-        qs = obj.recipes.all()
-        if limit:
-            qs = qs[:int(limit)]
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.pk, [])
+        else:
+            limit = RecipesLimitSerializer.from_request(
+                self.context['request']
+            )
+            recipes = obj.recipes.all()[:limit]
         return RecipeMinifiedSerializer(
-            qs,
+            recipes,
             many=True,
             context=self.context
         ).data
@@ -317,9 +426,33 @@ class UserWithRecipesSerializer(serializers.ModelSerializer):
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
     """Сериализатор для краткого отображения рецепта."""
+    image_set = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_set', 'cooking_time')
+
+    def get_image_set(self, obj):
+        return recipe_image_set(obj, self.context)
+
+
+class AuthorMinifiedSerializer(serializers.ModelSerializer):
+    """
+    Автор в ответе на подписку и отписку: без списка рецептов,
+    признак подписки передаётся в context['is_subscribed'].
+    """
+    is_subscribed = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = (
+            'id', 'email', 'username',
+            'first_name', 'last_name',
+            'is_subscribed', 'recipes_count', 'avatar'
+        )
+
+    def get_is_subscribed(self, obj):
+        return self.context['is_subscribed']
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -332,7 +465,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.BooleanField(read_only=True)
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.IntegerField(
-        source='author.recipes.count',
+        source='author.recipes_count',
         read_only=True
     )
 
@@ -0,0 +1,176 @@
+"""
+Потоковая выгрузка списка покупок в форматах txt, csv, json и pdf.
+
+Строки читаются итератором (в PostgreSQL — серверным курсором) и сразу
+отдаются клиенту. Готовый файл кэшируется по версии корзины пользователя
+и версии каталога, поэтому повторная выгрузка неизменной корзины
+не обращается к БД.
+"""
+import csv
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotAcceptable
+
+from api.cache import get_cart_version, get_catalog_version
+from api.constants import SHOPPING_LIST_CHUNK_SIZE
+from recipes.models import RecipeIngredient
+from recipes.units import aggregate_in_base_units, display_amount
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:  # pragma: no cover
+    canvas = None
+
+SHOPPING_LIST_CACHE_KEY = 'api:shopping_list:{}:{}:{}:{}'
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_SPOOL_SIZE = 1024 * 1024
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def shopping_list_items(user):
+    """
+    Суммы ингредиентов из корзины пользователя в единицах для показа:
+    словари name, amount, measurement_unit.
+    """
+    rows = aggregate_in_base_units(
+        RecipeIngredient.objects.filter(recipe__in_shopping_carts__user=user)
+    ).iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+    for row in rows:
+        amount, unit = display_amount(row['total'], row['unit'])
+        yield {
+            'name': row['name'],
+            'amount': amount,
+            'measurement_unit': unit,
+        }
+
+
+def _line(item):
+    return f"{item['name']} - {item['amount']} {item['measurement_unit']}"
+
+
+def render_txt(items):
+    for item in items:
+        yield f'{_line(item)}\n'.encode()
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(items):
+    writer = csv.writer(_Echo())
+    # BOM, чтобы Excel распознал UTF-8.
+    yield '\ufeff'.encode()
+    yield writer.writerow(
+        ('Ингредиент', 'Количество', 'Единица измерения')
+    ).encode()
+    for item in items:
+        yield writer.writerow((
+            item['name'], item['amount'], item['measurement_unit']
+        )).encode()
+
+
+def render_json(items):
+    separator = b'['
+    for item in items:
+        yield separator + json.dumps(item, ensure_ascii=False).encode()
+        separator = b','
+    yield b'[]' if separator == b'[' else b']'
+
+
+def pdf_available():
+    return canvas is not None and os.path.exists(
+        settings.SHOPPING_LIST_PDF_FONT
+    )
+
+
+def render_pdf(items):
+    """
+    PDF собирается во временный файл (в памяти до PDF_SPOOL_SIZE,
+    дальше на диске) и отдаётся кусками.
+    """
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+        )
+    with tempfile.SpooledTemporaryFile(PDF_SPOOL_SIZE) as file:
+        pdf = canvas.Canvas(file, pagesize=A4)
+        width, height = A4
+        margin, line_height = 50, 16
+        y = height - margin
+        pdf.setFont(PDF_FONT_NAME, 16)
+        pdf.drawString(margin, y, 'Список покупок')
+        y -= line_height * 2
+        pdf.setFont(PDF_FONT_NAME, 11)
+        for item in items:
+            if y < margin:
+                pdf.showPage()
+                pdf.setFont(PDF_FONT_NAME, 11)
+                y = height - margin
+            pdf.drawString(margin, y, _line(item))
+            y -= line_height
+        pdf.save()
+        file.seek(0)
+        while True:
+            chunk = file.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'json': (render_json, 'application/json'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
+
+
+def _cache_stream(chunks, key):
+    """Отдаёт куски дальше и кэширует файл, если он не слишком большой."""
+    buffer, size = [], 0
+    for chunk in chunks:
+        if buffer is not None:
+            size += len(chunk)
+            if size > settings.SHOPPING_LIST_CACHE_MAX_BYTES:
+                buffer = None
+            else:
+                buffer.append(chunk)
+        yield chunk
+    if buffer is not None:
+        cache.set(
+            key, b''.join(buffer), settings.SHOPPING_LIST_CACHE_TIMEOUT
+        )
+
+
+def shopping_list_response(user, file_format):
+    if file_format == 'pdf' and not pdf_available():
+        raise NotAcceptable('Выгрузка в PDF недоступна.')
+    render, content_type = SHOPPING_LIST_FORMATS[file_format]
+    key = SHOPPING_LIST_CACHE_KEY.format(
+        user.pk,
+        get_cart_version(user.pk),
+        get_catalog_version(),
+        file_format,
+    )
+    content = cache.get(key)
+    if content is not None:
+        chunks = [content]
+    else:
+        chunks = _cache_stream(render(shopping_list_items(user)), key)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{file_format}"'
+    )
+    return response
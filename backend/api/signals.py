@@ -0,0 +1,194 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from api.cache import (
+    bump_cart_version, bump_catalog_version, bump_ingredients_version,
+    bump_tags_version, invalidate_tag_universe,
+)
+from recipes.counters import adjust_related_counters
+from recipes.feed import backfill_feed, remove_from_feed, schedule_fan_out
+from recipes.images import is_stale, process_image, variants_field
+from recipes.media import release
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+)
+from recipes.search import (
+    is_supported, refresh_ingredient_recipes, refresh_search_vectors
+)
+from tasks.queue import enqueue
+from users.models import Subscription
+
+User = get_user_model()
+
+# Поля пользователя, которые попадают в выдачу рецептов как автор.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name', 'avatar')
+
+
+def _catalog_changed():
+    transaction.on_commit(bump_catalog_version)
+
+
+def _tag_universe_changed():
+    transaction.on_commit(invalidate_tag_universe)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _tag_universe_changed()
+        _catalog_changed()
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_universe_changed(sender, **kwargs):
+    _tag_universe_changed()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=User)
+def catalog_changed(sender, **kwargs):
+    _catalog_changed()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    transaction.on_commit(bump_ingredients_version)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(sender, **kwargs):
+    transaction.on_commit(bump_tags_version)
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_cart_version(user_id))
+
+
+@receiver(pre_save, sender=User)
+def author_changing(sender, instance, update_fields=None, **kwargs):
+    """
+    Отмечает, изменились ли поля автора, видимые в рецептах. Пользователи
+    без рецептов и правки других полей кэш каталога не сбрасывают.
+    """
+    instance._author_changed = False
+    if instance._state.adding or not instance.recipes_count:
+        return
+    fields = [
+        name for name in AUTHOR_FIELDS
+        if update_fields is None or name in update_fields
+    ]
+    if not fields:
+        return
+    saved = User.objects.filter(pk=instance.pk).values(*fields).first()
+    if saved is None:
+        return
+    current = {name: getattr(instance, name) for name in fields}
+    if 'avatar' in current:
+        current['avatar'] = current['avatar'].name or ''
+        saved['avatar'] = saved['avatar'] or ''
+    instance._author_changed = saved != current
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, **kwargs):
+    if getattr(instance, '_author_changed', False):
+        _catalog_changed()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+def counted_object_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_related_counters(sender, [instance], 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def counted_object_deleted(sender, instance, **kwargs):
+    adjust_related_counters(sender, [instance], -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: schedule_fan_out(instance))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_vector(sender, instance, **kwargs):
+    """После коммита: ингредиенты рецепта к этому моменту уже записаны."""
+    if is_supported():
+        transaction.on_commit(lambda: refresh_search_vectors(
+            Recipe.objects.filter(pk=instance.pk)
+        ))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_search_vectors(sender, instance, created, **kwargs):
+    if not created and is_supported():
+        enqueue(refresh_ingredient_recipes, instance.pk)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        backfill_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    remove_from_feed(instance.user_id, instance.author_id)
+
+
+def _schedule_variants(sender, instance, field_name):
+    name = getattr(instance, field_name).name
+    variants = getattr(instance, variants_field(field_name))
+    if not is_stale(name, variants):
+        return
+    enqueue(process_image, sender._meta.label, instance.pk, field_name)
+    if variants.get('source'):
+        enqueue(release, variants['source'], variants)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    _schedule_variants(sender, instance, 'image')
+
+
+@receiver(post_save, sender=User)
+def avatar_saved(sender, instance, **kwargs):
+    _schedule_variants(sender, instance, 'avatar')
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    if instance.image:
+        enqueue(release, instance.image.name, instance.image_variants)
+
+
+@receiver(post_delete, sender=User)
+def avatar_deleted(sender, instance, **kwargs):
+    if instance.avatar:
+        enqueue(release, instance.avatar.name, instance.avatar_variants)
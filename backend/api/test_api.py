@@ -0,0 +1,129 @@
+import datetime
+import decimal
+import io
+import json
+import time
+
+import pytest
+from django.db import connection
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.metrics import registry
+from api.nplusone import NPlusOneDetector, NPlusOneError, allow_nplusone
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+from api.serializers import TagSerializer
+from recipes.models import Tag
+from users.models import User
+
+
+def test_fast_json_renderer_matches_json_renderer():
+    data = {
+        'pub_date': datetime.datetime(
+            2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc
+        ),
+        'day': datetime.date(2024, 1, 2),
+        'amount': decimal.Decimal('1.50'),
+        'lazy': gettext_lazy('Рецепт'),
+        'separator': 'a\u2028b',
+        'nested': [{'id': 1, 'image': None}],
+        1: 'int key',
+    }
+    expected = JSONRenderer().render(data)
+    assert FastJSONRenderer().render(data) == expected
+    assert FastJSONRenderer().render(
+        data, 'application/json; indent=4'
+    ) == JSONRenderer().render(data, 'application/json; indent=4')
+
+
+def test_fast_json_parser():
+    payload = {'name': 'Борщ', 'ingredients': [{'id': 1, 'amount': 10}]}
+    stream = io.BytesIO(json.dumps(payload).encode())
+    assert FastJSONParser().parse(stream) == payload
+
+
+def server_timing(response):
+    return {
+        entry.split(';')[0]: float(entry.split('dur=')[1].split(';')[0])
+        for entry in response['Server-Timing'].split(', ')
+    }
+
+
+@pytest.mark.django_db
+def test_server_timing_and_metrics_endpoint(settings):
+    settings.METRICS_FLUSH_INTERVAL = 0
+    registry.reset()
+    Tag.objects.create(name='Ужин', color='#8775D2', slug='dinner')
+    client = APIClient()
+
+    response = client.get('/api/tags/')
+    timing = response['Server-Timing']
+    assert 'queries"' in timing and 'render;dur=' in timing
+    assert 'serialize;dur=' in timing
+
+    outside = {'REMOTE_ADDR': '203.0.113.5'}
+    assert client.get('/api/metrics', **outside).status_code == 401
+    assert client.get(
+        '/api/metrics', REMOTE_ADDR='172.18.0.3',
+        HTTP_X_REAL_IP='203.0.113.5'
+    ).status_code == 401
+    staff = User.objects.create_user(
+        username='admin', email='admin@example.com', password='x',
+        is_staff=True
+    )
+    client.force_authenticate(staff)
+    response = client.get('/api/metrics', **outside)
+    assert response.status_code == 200
+    body = response.content.decode()
+    assert (
+        'foodgram_http_requests_total'
+        '{view="api:tags-list",method="GET",status="200"} 1'
+    ) in body
+    assert (
+        'foodgram_http_request_duration_seconds_count'
+        '{view="api:tags-list",method="GET"} 1'
+    ) in body
+    assert 'foodgram_http_request_queries_bucket{view="api:tags-list",' in body
+    assert 'foodgram_response_cache_total' in body
+
+
+@pytest.mark.django_db
+def test_server_timing_counts_serialization(monkeypatch):
+    Tag.objects.create(name='Ужин', color='#8775D2', slug='dinner')
+    to_representation = TagSerializer.to_representation
+
+    def slow(serializer, instance):
+        time.sleep(0.05)
+        return to_representation(serializer, instance)
+
+    monkeypatch.setattr(TagSerializer, 'to_representation', slow)
+    timing = server_timing(APIClient().get('/api/tags/'))
+    assert 50 <= timing['serialize'] <= timing['total']
+
+
+@pytest.mark.django_db
+def test_nplusone_detector(caplog):
+    tags = Tag.objects.bulk_create(
+        Tag(name=f'Тег {i}', color=f'#00000{i}', slug=f'tag-{i}')
+        for i in range(4)
+    )
+
+    def load_each():
+        for tag in tags:
+            Tag.objects.get(pk=tag.pk)
+
+    with connection.execute_wrapper(NPlusOneDetector(3, 'raise')):
+        Tag.objects.filter(pk__in=[tag.pk for tag in tags]).count()
+        with allow_nplusone():
+            load_each()
+        with pytest.raises(NPlusOneError, match='повторён 4 раз'):
+            load_each()
+
+    with connection.execute_wrapper(NPlusOneDetector(3, 'log', 'GET /')):
+        load_each()
+        load_each()
+    warnings = [record.getMessage() for record in caplog.records]
+    assert len(warnings) == 1
+    assert 'test_api.py' in warnings[0] and 'in load_each' in warnings[0]
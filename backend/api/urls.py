@@ -6,6 +6,7 @@ from .views import (
     RecipeViewSet,
     TagViewSet,
     UserViewSet,
+    metrics,
 )
 
 app_name = 'api'
@@ -17,7 +18,7 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', UserViewSet, basename='users')
 
 urlpatterns = [
-
+    path('metrics', metrics, name='metrics'),
     path(
         'recipes/favorites/',
         RecipeViewSet.as_view({'get': 'favorites'}),
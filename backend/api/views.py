@@ -1,85 +1,124 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Value
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser import permissions as djoser_permissions
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import filters, permissions, status, viewsets
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 
+from api.autocomplete import search_ingredients
+from api.cache import get_ingredients_version, get_tags_version
+from api.fast_read import recipe_rows
 from api.filters import RecipeFilter
-from api.pagination import CustomPagination
-from api.permissions import IsAuthorOrAdminOrReadOnly
+from api.metrics import collect, render_prometheus
+from api.mixins import AnonymousResponseCacheMixin, ConditionalListMixin
+from api.pagination import CustomPagination, KeysetPagination
+from api.permissions import IsAuthorOrAdminOrReadOnly, IsStaffOrInternalIP
+from api.renderers import (
+    FastJSONRenderer, ShoppingListCSVRenderer, ShoppingListPDFRenderer,
+    ShoppingListTextRenderer,
+)
 from api.serializers import (
+    AuthorMinifiedSerializer,
     IngredientSerializer,
+    RecipeIdsSerializer,
+    RecipeMinifiedSerializer,
     RecipeReadSerializer,
+    RecipeRowsSerializer,
+    RecipesLimitSerializer,
     RecipeWriteSerializer,
     TagSerializer,
     UserCreateSerializer,
     UserListSerializer,
     UserWithRecipesSerializer
 )
-from recipes.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient,
-    ShoppingCart, Tag
-)
+from api.shopping_list import shopping_list_response
+from recipes.feed import FEED_ORDERING, feed_queryset
+from recipes.media import release
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.relations import add_recipes, link, remove_recipes, unlink
+from tasks.queue import enqueue
 from users.models import Subscription
 from users.serializers import UserSetPasswordSerializer
 
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = None
+    data_version = staticmethod(get_tags_version)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [permissions.AllowAny]
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
     pagination_class = None
+    data_version = staticmethod(get_ingredients_version)
 
-    def get_queryset(self):
-        qs = Ingredient.objects.all()
-        name = self.request.query_params.get('name')
-        if name:
-            qs = qs.filter(name__icontains=name)
-        return qs
+    def get_list_response(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().get_list_response(request, *args, **kwargs)
+        return Response(search_ingredients(name))
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all().order_by('-pub_date')
     permission_classes = [IsAuthorOrAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
-    search_fields = ['name']
     pagination_class = CustomPagination
+    response_cache_scope = 'recipes'
+
+    def use_fast_read(self):
+        return (
+            settings.RECIPE_READ_FAST_PATH
+            and self.action in ('list', 'favorites', 'feed')
+        )
+
+    @property
+    def cursor_pagination(self):
+        return self.action == 'feed'
+
+    @property
+    def cursor_ordering(self):
+        if self.action == 'feed':
+            return FEED_ORDERING
+        return KeysetPagination.ordering
 
     def get_serializer_class(self):
+        if self.use_fast_read():
+            return RecipeRowsSerializer
         if self.action in [
-            'list', 'retrieve', 'favorites',
+            'list', 'retrieve', 'favorites', 'feed',
             'download_shopping_cart', 'get_link'
         ]:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
     def get_queryset(self):
-        qs = Recipe.objects.all().order_by('-pub_date')
-        if hasattr(self, 'filterset_class'):
-            self.filterset = self.filterset_class(
-                self.request.GET,
-                queryset=qs,
-                request=self.request
-            )
-            qs = self.filterset.qs
-        return qs
+        return Recipe.objects.with_related(
+            self.request.user
+        ).order_by('-pub_date')
+
+    def filter_queryset(self, queryset):
+        # Фильтры применяет DjangoFilterBackend: RecipeFilter проверяется
+        # один раз за запрос
+        queryset = super().filter_queryset(queryset)
+        if self.use_fast_read():
+            queryset = recipe_rows(queryset)
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -104,60 +143,87 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request, pk, ShoppingCart, 'shopping_cart'
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='favorite'
+    )
+    def bulk_favorite(self, request):
+        return self._handle_bulk(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='shopping_cart'
+    )
+    def bulk_shopping_cart(self, request):
+        return self._handle_bulk(request, ShoppingCart)
+
+    def _handle_bulk(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            outcome = add_recipes(model, request.user, recipe_ids)
+        else:
+            outcome = remove_recipes(model, request.user, recipe_ids)
+        return Response({'results': [
+            {'id': pk, 'status': outcome[pk]} for pk in recipe_ids
+        ]})
+
+    @transaction.atomic
     def _handle_favorite_shopping_cart(self, request, pk, model, action_name):
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
+        recipe = get_object_or_404(
+            Recipe.objects.only(
+                'name', 'image', 'image_variants', 'cooking_time'
+            ),
+            pk=pk
+        )
+        serializer = RecipeMinifiedSerializer(
+            recipe, context={'request': request}
+        )
 
         if request.method == 'POST':
-            if model.objects.filter(user=user, recipe=recipe).exists():
+            if link(model, request.user, recipe=recipe) is None:
                 return Response(
                     {'errors': f'Рецепт уже добавлен в {action_name}'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            model.objects.create(user=user, recipe=recipe)
-            serializer = RecipeReadSerializer(
-                recipe, context={'request': request}
-            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if request.method == 'DELETE':
-            obj = get_object_or_404(model, user=user, recipe=recipe)
-            obj.delete()
-            serializer = RecipeReadSerializer(
-                recipe, context={'request': request}
+        if not unlink(model, request.user, recipe=recipe):
+            return Response(
+                {'errors': f'Рецепта нет в {action_name}'},
+                status=status.HTTP_404_NOT_FOUND
             )
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(
         detail=False,
-        permission_classes=[permissions.IsAuthenticated]
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            FastJSONRenderer,
+            ShoppingListPDFRenderer,
+        ]
     )
     def download_shopping_cart(self, request):
-        user = request.user
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in_shopping_carts__user=user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(
-            total_amount=Sum('amount')
-        ).order_by('ingredient__name')
-
-        shopping_list = []
-        for ingredient in ingredients:
-            shopping_list.append(
-                f"{ingredient['ingredient__name']} - "
-                f"{ingredient['total_amount']} "
-                f"{ingredient['ingredient__measurement_unit']}"
-            )
-
-        response = HttpResponse(
-            '\n'.join(shopping_list),
-            content_type='text/plain'
-        )
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+        return shopping_list_response(
+            request.user, request.accepted_renderer.format
         )
+
+    def handle_exception(self, exc):
+        response = super().handle_exception(exc)
+        # Текст ошибки не может быть PDF-файлом: отдаём его в JSON
+        if isinstance(
+            getattr(self.request, 'accepted_renderer', None),
+            ShoppingListPDFRenderer
+        ):
+            self.request.accepted_renderer = FastJSONRenderer()
+            self.request.accepted_media_type = FastJSONRenderer.media_type
         return response
 
     @action(
@@ -181,7 +247,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
         favs = Recipe.objects.filter(
             in_favorites__user=user
-        ).order_by('-pub_date')
+        ).with_related(user).order_by('-pub_date')
 
         if hasattr(self, 'filterset_class'):
             self.filterset = self.filterset_class(
@@ -191,20 +257,36 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
             favs = self.filterset.qs
 
+        if self.use_fast_read():
+            favs = recipe_rows(favs)
         page = self.paginate_queryset(favs)
-        serializer = RecipeReadSerializer(
-            page or favs,
-            many=True,
-            context={'request': request}
+        serializer = self.get_serializer(
+            page if page is not None else favs,
+            many=True
         )
         return self.get_paginated_response(serializer.data)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def feed(self, request):
+        user = request.user
+        recipes = feed_queryset(user).with_related(user)
+        if self.use_fast_read():
+            recipes = recipe_rows(recipes, 'feed_pub_date')
+        page = self.paginate_queryset(recipes)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class UserViewSet(DjoserUserViewSet):
     queryset = User.objects.all()
     serializer_class = UserListSerializer
     permission_classes = [djoser_permissions.CurrentUserOrAdminOrReadOnly]
     pagination_class = CustomPagination
+    cursor_ordering = ('id',)
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -221,6 +303,7 @@ class UserViewSet(DjoserUserViewSet):
         methods=['post', 'delete'],
         permission_classes=[permissions.IsAuthenticated]
     )
+    @transaction.atomic
     def subscribe(self, request, pk=None):
         user = request.user
         author = get_object_or_404(User, id=pk)
@@ -231,26 +314,25 @@ class UserViewSet(DjoserUserViewSet):
                     {'errors': 'Нельзя подписаться на самого себя'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            if user.following.filter(author=author).exists():
+            if link(Subscription, user, author=author) is None:
                 return Response(
                     {'errors': 'Вы уже подписаны на этого пользователя'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            Subscription.objects.create(user=user, author=author)
-            serializer = UserWithRecipesSerializer(
-                author, context={'request': request}
+            serializer = AuthorMinifiedSerializer(
+                author, context={'request': request, 'is_subscribed': True}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if request.method == 'DELETE':
-            subscription = get_object_or_404(
-                Subscription, user=user, author=author
+        if not unlink(Subscription, user, author=author):
+            return Response(
+                {'errors': 'Вы не подписаны на этого пользователя'},
+                status=status.HTTP_404_NOT_FOUND
             )
-            subscription.delete()
-            serializer = UserWithRecipesSerializer(
-                author, context={'request': request}
-            )
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        serializer = AuthorMinifiedSerializer(
+            author, context={'request': request, 'is_subscribed': False}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(
         detail=False,
@@ -258,16 +340,24 @@ class UserViewSet(DjoserUserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        limit = RecipesLimitSerializer.from_request(request)
+        queryset = User.objects.filter(
+            following__user=user
+        ).annotate(is_subscribed=Value(True))
         page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = UserWithRecipesSerializer(
-                page, many=True, context={'request': request}
-            )
-            return self.get_paginated_response(serializer.data)
+        authors = page if page is not None else list(queryset)
         serializer = UserWithRecipesSerializer(
-            queryset, many=True, context={'request': request}
+            authors,
+            many=True,
+            context={
+                'request': request,
+                'recipes_by_author': Recipe.objects.latest_by_author(
+                    [author.pk for author in authors], limit
+                ),
+            }
         )
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
         return Response(serializer.data)
 
     @action(
@@ -291,8 +381,13 @@ class UserViewSet(DjoserUserViewSet):
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         if user.avatar:
-            user.avatar.delete()
-            user.save()
+            # Файл может быть общим с другими строками: удалит его release,
+            # когда на него не останется ссылок
+            name, variants = user.avatar.name, user.avatar_variants
+            user.avatar = None
+            user.avatar_variants = {}
+            user.save(update_fields=['avatar', 'avatar_variants'])
+            enqueue(release, name, variants)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -338,3 +433,13 @@ class UserViewSet(DjoserUserViewSet):
             {'detail': 'Активация не требуется'},
             status=status.HTTP_200_OK
         )
+
+
+@api_view(['GET'])
+@permission_classes([IsStaffOrInternalIP])
+def metrics(request):
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    return HttpResponse(
+        render_prometheus(collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
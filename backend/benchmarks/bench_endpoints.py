@@ -0,0 +1,237 @@
+"""
+Задержка и число SQL-запросов основных эндпоинтов API на большом наборе
+данных (seed_scale) в сравнении с сохранённой базовой линией.
+
+Запуск из backend/:
+    python -m pytest benchmarks/bench_endpoints.py -s
+
+Переменные окружения:
+    BENCH_SCALE=2             — множитель размера набора данных;
+    BENCH_TOLERANCE=0.5       — включить проверку p50 с этим допуском;
+    BENCH_UPDATE_BASELINE=1   — записать результаты как новую базовую линию.
+
+Проверяется только число запросов, строго: оно не зависит от машины и
+нагрузки. Задержки печатаются рядом с базовыми; проверка p50 включается
+через BENCH_TOLERANCE и имеет смысл, только если базовая линия снята на
+той же машине. Разница меньше NOISE_MS при этом всегда считается шумом.
+Базовая линия своя для каждой СУБД (baseline-<vendor>.json): планы и число
+запросов у SQLite и PostgreSQL различаются; если файла для текущей СУБД
+нет, он записывается первым прогоном. Значения в файле не правят руками —
+его перезаписывают с BENCH_UPDATE_BASELINE=1.
+"""
+import base64
+import json
+import os
+import time
+from io import BytesIO, StringIO
+from itertools import count
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.cache import bump_cart_version
+from helpers import percentile
+from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from users.models import User
+
+BASELINE_DIR = os.path.dirname(__file__)
+SCALE = float(os.getenv('BENCH_SCALE', '1'))
+# Без BENCH_TOLERANCE задержка только печатается
+TOLERANCE = (
+    float(os.environ['BENCH_TOLERANCE'])
+    if os.getenv('BENCH_TOLERANCE') else None
+)
+UPDATE_BASELINE = os.getenv('BENCH_UPDATE_BASELINE') == '1'
+# Разница по p50 меньше этой считается шумом, в мс
+NOISE_MS = 10
+DATASET = {
+    'users': 500,
+    'recipes': 5000,
+    'favorites': 50000,
+    'carts': 2000,
+    'subscriptions': 5000,
+}
+CART_RECIPES = 20
+WARMUP = 2
+REPEATS = 30
+PERCENTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+
+def image_data():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def recipe_payload(number, tags, ingredients):
+    return {
+        'name': f'Бенчмарк {number}',
+        'text': 'Описание',
+        'cooking_time': 10 + number % 50,
+        'image': image_data(),
+        'tags': tags,
+        'ingredients': [{'id': pk, 'amount': 100} for pk in ingredients],
+    }
+
+
+def seed():
+    """Набор данных и читатель с подписками, избранным и корзиной."""
+    call_command(
+        'seed_scale', workers=1, stdout=StringIO(),
+        **{key: int(value * SCALE) for key, value in DATASET.items()}
+    )
+    reader = User.objects.order_by('-following_count', 'pk').first()
+    popular = Recipe.objects.order_by('-favorites_count', 'pk')
+    ShoppingCart.objects.bulk_create(
+        [
+            ShoppingCart(user=reader, recipe=recipe)
+            for recipe in popular[:CART_RECIPES]
+        ],
+        ignore_conflicts=True
+    )
+    return reader, popular.first()
+
+
+def endpoints(reader, recipe):
+    """{название: функция запроса} для клиента читателя."""
+    client = APIClient()
+    client.force_authenticate(reader)
+    author = User.objects.order_by('-recipes_count', 'pk').first()
+    tags = list(Tag.objects.order_by('pk').values_list('pk', flat=True)[:2])
+    slugs = Tag.objects.filter(pk__in=tags).values_list('slug', flat=True)
+    ingredients = list(
+        Ingredient.objects.order_by('pk').values_list('pk', flat=True)[:8]
+    )
+    numbers = count()
+
+    def download_cold():
+        bump_cart_version(reader.pk)
+        return client.get('/api/recipes/download_shopping_cart/')
+
+    own = client.post(
+        '/api/recipes/', recipe_payload(next(numbers), tags, ingredients),
+        format='json'
+    ).data['id']
+    return {
+        'recipe_list': lambda: client.get('/api/recipes/'),
+        'recipe_list_tags': lambda: client.get(
+            '/api/recipes/', {'tags': list(slugs)}
+        ),
+        'recipe_list_author': lambda: client.get(
+            '/api/recipes/', {'author': author.pk}
+        ),
+        'recipe_list_favorited': lambda: client.get(
+            '/api/recipes/', {'is_favorited': 1}
+        ),
+        'recipe_detail': lambda: client.get(f'/api/recipes/{recipe.pk}/'),
+        'favorites': lambda: client.get('/api/recipes/favorites/'),
+        'subscriptions': lambda: client.get('/api/users/subscriptions/'),
+        'download_shopping_cart': lambda: client.get(
+            '/api/recipes/download_shopping_cart/'
+        ),
+        'download_shopping_cart_cold': download_cold,
+        'ingredient_search': lambda: client.get(
+            '/api/ingredients/', {'name': 'мук'}
+        ),
+        'recipe_create': lambda: client.post(
+            '/api/recipes/',
+            recipe_payload(next(numbers), tags, ingredients),
+            format='json'
+        ),
+        'recipe_update': lambda: client.patch(
+            f'/api/recipes/{own}/',
+            recipe_payload(next(numbers), tags, ingredients),
+            format='json'
+        ),
+    }
+
+
+def run(request):
+    """{'p50', 'p95', 'p99' в мс, 'queries'} для одного эндпоинта."""
+    for _ in range(WARMUP):
+        response = request()
+        if response.streaming:
+            b''.join(response.streaming_content)
+    timings, queries = [], 0
+    for _ in range(REPEATS):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = request()
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code < 400, response.content[:200]
+        queries = max(queries, len(ctx.captured_queries))
+    result = {
+        name: round(percentile(timings, share), 2)
+        for name, share in PERCENTILES
+    }
+    result['queries'] = queries
+    return result
+
+
+def regressions(name, result, baseline):
+    if baseline is None:
+        return []
+    problems = []
+    if result['queries'] > baseline['queries']:
+        problems.append(
+            f'{name}: запросов {result["queries"]}, '
+            f'в базовой линии {baseline["queries"]}'
+        )
+    if TOLERANCE is None:
+        return problems
+    limit = baseline['p50'] * (1 + TOLERANCE)
+    if result['p50'] > limit and result['p50'] - baseline['p50'] > NOISE_MS:
+        problems.append(
+            f'{name}: p50 {result["p50"]} мс, '
+            f'в базовой линии {baseline["p50"]} мс (+{TOLERANCE:.0%})'
+        )
+    return problems
+
+
+@pytest.mark.django_db
+def test_endpoint_budgets():
+    baseline_path = os.path.join(
+        BASELINE_DIR, f'baseline-{connection.vendor}.json'
+    )
+    baseline = {}
+    if os.path.exists(baseline_path) and not UPDATE_BASELINE:
+        with open(baseline_path, encoding='utf-8') as file:
+            baseline = json.load(file)
+    conditions = {'scale': SCALE, 'database': connection.vendor}
+    if baseline and any(
+        baseline.get(key) != value for key, value in conditions.items()
+    ):
+        pytest.fail(
+            f'Базовая линия снята при других условиях: '
+            f'BENCH_SCALE={baseline.get("scale")}, '
+            f'база данных {baseline.get("database")}; '
+            f'обновите её с BENCH_UPDATE_BASELINE=1'
+        )
+    results = {}
+    problems = []
+    print()
+    print(f'{"эндпоинт":>28} {"p50":>8} {"p95":>8} {"p99":>8} '
+          f'{"запросы":>8} {"база p50":>9}')
+    for name, request in endpoints(*seed()).items():
+        results[name] = result = run(request)
+        expected = baseline.get('endpoints', {}).get(name)
+        problems += regressions(name, result, expected)
+        print(f'{name:>28} {result["p50"]:>8.2f} {result["p95"]:>8.2f} '
+              f'{result["p99"]:>8.2f} {result["queries"]:>8} '
+              f'{expected["p50"] if expected else "—":>9}')
+    if UPDATE_BASELINE or not baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {**conditions, 'endpoints': results}, file,
+                ensure_ascii=False, indent=2, sort_keys=True
+            )
+            file.write('\n')
+        print(f'Базовая линия записана в {baseline_path}')
+    assert not problems, 'Регрессии:\n' + '\n'.join(problems)
@@ -0,0 +1,119 @@
+"""
+Лента подписок: выборка при чтении против таблицы ленты (fan-out-on-write).
+
+Запуск из backend/:
+    python -m pytest benchmarks/bench_feed.py -s
+"""
+import random
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from helpers import measure
+from recipes.counters import reconcile_counters
+from recipes.feed import FEED_ORDERING, fan_out_recipe, feed_queryset
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription, User
+
+FOLLOWS = (10_000, 100_000)
+READERS = 1000
+AUTHORS = 1000
+RECIPES_PER_AUTHOR = 10
+PAGE_SIZE = 6
+SAMPLE_READERS = 20
+REPEATS = 5
+
+
+def seed_follows(follows):
+    """Подписки читателей на случайных авторов и готовые ленты."""
+    rng = random.Random(follows)
+    authors = User.objects.bulk_create(
+        User(username=f'author{i}', email=f'author{i}@example.com')
+        for i in range(AUTHORS)
+    )
+    readers = User.objects.bulk_create(
+        User(username=f'reader{i}', email=f'reader{i}@example.com')
+        for i in range(READERS)
+    )
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author=author, name=f'Рецепт {author.pk}-{i}',
+                image='recipes/test.jpg', text='Описание', cooking_time=10
+            )
+            for author in authors for i in range(RECIPES_PER_AUTHOR)
+        ),
+        batch_size=5000
+    )
+    per_reader = follows // READERS
+    Subscription.objects.bulk_create(
+        (
+            Subscription(user=reader, author=author)
+            for reader in readers
+            for author in rng.sample(authors, per_reader)
+        ),
+        batch_size=5000
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FeedEntry._meta.db_table} '
+            '(user_id, recipe_id, pub_date) '
+            'SELECT s.user_id, r.id, r.pub_date '
+            f'FROM {Subscription._meta.db_table} s '
+            f'JOIN {Recipe._meta.db_table} r ON r.author_id = s.author_id'
+        )
+    reconcile_counters()
+    return readers, authors
+
+
+def read_page(queryset, ordering=('-pub_date', '-id')):
+    return list(
+        queryset.order_by(*ordering).values_list('id', flat=True)[:PAGE_SIZE]
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('follows', FOLLOWS)
+def test_feed_strategies(follows):
+    readers, authors = seed_follows(follows)
+    sample = random.Random(0).sample(readers, SAMPLE_READERS)
+
+    def on_read():
+        for reader in sample:
+            read_page(Recipe.objects.filter(
+                author__in=reader.follower.values('author_id')
+            ))
+
+    def on_write():
+        for reader in sample:
+            read_page(feed_queryset(reader), FEED_ORDERING)
+
+    for reader in sample:
+        assert read_page(feed_queryset(reader), FEED_ORDERING) == read_page(
+            Recipe.objects.filter(
+                author__in=reader.follower.values('author_id')
+            )
+        )
+    read_ms, read_queries = measure(on_read, REPEATS)
+    write_ms, write_queries = measure(on_write, REPEATS)
+
+    author = authors[0]
+    recipe = Recipe.objects.create(
+        author=author, name='Новый', image='recipes/test.jpg',
+        text='Описание', cooking_time=10
+    )
+    with CaptureQueriesContext(connection) as ctx:
+        started = time.perf_counter()
+        fan_out_recipe(recipe.pk)
+        fanout_ms = (time.perf_counter() - started) * 1000
+
+    print()
+    print(f'подписок: {follows}, лента: {FeedEntry.objects.count()} строк')
+    print(f'чтение, выборка по авторам: {read_ms / SAMPLE_READERS:.2f} мс '
+          f'на страницу, {read_queries // SAMPLE_READERS} запрос(а)')
+    print(f'чтение из ленты: {write_ms / SAMPLE_READERS:.2f} мс '
+          f'на страницу, {write_queries // SAMPLE_READERS} запрос(а)')
+    print(f'раскладка рецепта на {author.following.count()} подписчиков: '
+          f'{fanout_ms:.2f} мс, {len(ctx.captured_queries)} запросов')
@@ -0,0 +1,37 @@
+"""
+Сравнение RecipeReadSerializer и быстрого пути api.fast_read.
+
+Запуск из backend/:
+    python -m pytest benchmarks/bench_recipe_read.py -s
+"""
+import pytest
+
+from api.fast_read import recipe_rows
+from api.serializers import RecipeReadSerializer, RecipeRowsSerializer
+from helpers import drf_request, measure, seed_recipes
+from recipes.models import Recipe
+
+PAGE_SIZES = (6, 50, 200)
+REPEATS = 20
+
+
+@pytest.mark.django_db
+def test_fast_read_speedup():
+    user = seed_recipes(max(PAGE_SIZES))
+    context = {'request': drf_request(user)}
+    queryset = Recipe.objects.with_related(user).order_by('-pub_date')
+
+    print()
+    print(f'{"на странице":>12} {"serializer, мс":>15} {"fast, мс":>10} '
+          f'{"запросы":>9} {"ускорение":>10}')
+    for size in PAGE_SIZES:
+        slow_ms, slow_queries = measure(lambda: RecipeReadSerializer(
+            list(queryset[:size]), many=True, context=context
+        ).data, REPEATS)
+        fast_ms, fast_queries = measure(lambda: RecipeRowsSerializer(
+            list(recipe_rows(queryset)[:size]), many=True, context=context
+        ).data, REPEATS)
+        print(f'{size:>12} {slow_ms:>15.2f} {fast_ms:>10.2f} '
+              f'{slow_queries:>4}/{fast_queries:<4} '
+              f'{slow_ms / fast_ms:>9.1f}x')
+        assert fast_ms < slow_ms
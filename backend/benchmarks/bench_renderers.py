@@ -0,0 +1,64 @@
+"""
+Кодирование JSON: JSONRenderer (stdlib) против FastJSONRenderer (orjson)
+на страницах рецептов и полном справочнике ингредиентов.
+
+Запуск из backend/:
+    python -m pytest benchmarks/bench_renderers.py -s
+"""
+import csv
+import os
+
+import pytest
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_read import recipe_rows
+from api.renderers import FastJSONRenderer
+from api.serializers import RecipeRowsSerializer
+from helpers import drf_request, measure, seed_recipes
+from recipes.models import Recipe
+
+PAGE_SIZES = (6, 50, 200)
+REPEATS = 200
+
+
+def _ingredients_payload():
+    path = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+    with open(path, encoding='utf-8') as f:
+        return [
+            {'id': i, 'name': row[0], 'measurement_unit': row[1]}
+            for i, row in enumerate(csv.reader(f), start=1)
+        ]
+
+
+@pytest.mark.django_db
+def test_renderer_speedup():
+    user = seed_recipes(max(PAGE_SIZES))
+    context = {'request': drf_request(user)}
+    rows = list(recipe_rows(
+        Recipe.objects.with_user_flags(user).order_by('-pub_date')
+    ))
+    payloads = [
+        (f'рецепты x{size}', {
+            'count': len(rows), 'next': None, 'previous': None,
+            'results': RecipeRowsSerializer(
+                rows[:size], many=True, context=context
+            ).data,
+        })
+        for size in PAGE_SIZES
+    ]
+    payloads.append(('ингредиенты', _ingredients_payload()))
+
+    print()
+    print(f'{"данные":>16} {"json, мс":>9} {"orjson, мс":>11} '
+          f'{"байты":>15} {"ускорение":>10}')
+    for title, data in payloads:
+        slow_ms, _ = measure(lambda: JSONRenderer().render(data), REPEATS)
+        fast_ms, _ = measure(
+            lambda: FastJSONRenderer().render(data), REPEATS
+        )
+        slow_size = len(JSONRenderer().render(data))
+        fast_size = len(FastJSONRenderer().render(data))
+        print(f'{title:>16} {slow_ms:>9.3f} {fast_ms:>11.3f} '
+              f'{slow_size:>7}/{fast_size:<7} {slow_ms / fast_ms:>9.1f}x')
+        assert fast_size == slow_size
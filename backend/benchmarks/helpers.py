@@ -0,0 +1,75 @@
+import math
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+TAGS_PER_RECIPE = 3
+INGREDIENTS_PER_RECIPE = 8
+
+
+def seed_recipes(count):
+    """Создаёт count рецептов с тегами и ингредиентами, возвращает читателя."""
+    tags = Tag.objects.bulk_create(
+        Tag(name=f'Тег {i}', color=f'#00000{i}', slug=f'tag-{i}')
+        for i in range(TAGS_PER_RECIPE)
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+        for i in range(INGREDIENTS_PER_RECIPE)
+    )
+    authors = User.objects.bulk_create(
+        User(username=f'author{i}', email=f'author{i}@example.com')
+        for i in range(count // 4 + 1)
+    )
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=authors[i % len(authors)],
+            name=f'Рецепт {i}',
+            image='recipes/test.jpg',
+            text='Описание ' * 20,
+            cooking_time=10 + i % 50,
+        )
+        for i in range(count)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for recipe in recipes for tag in tags
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=100)
+        for recipe in recipes for ingredient in ingredients
+    )
+    return User.objects.create_user(
+        username='reader', email='reader@example.com', password='x'
+    )
+
+
+def drf_request(user, path='/api/recipes/'):
+    factory_request = APIRequestFactory().get(path)
+    force_authenticate(factory_request, user)
+    request = Request(factory_request)
+    request.user = user
+    return request
+
+
+def measure(func, repeats):
+    """Среднее время вызова в мс и число SQL-запросов одного вызова."""
+    with CaptureQueriesContext(connection) as ctx:
+        func()
+    queries = len(ctx.captured_queries)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - started) / repeats * 1000, queries
+
+
+def percentile(samples, share):
+    """Перцентиль share (0..1) по ближайшему рангу."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
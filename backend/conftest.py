@@ -0,0 +1,43 @@
+import pytest
+from django.core.cache import caches
+
+
+def pytest_addoption(parser):
+    parser.addini(
+        'nplusone_mode', 'Режим поиска N+1: off, log или raise',
+        default='raise'
+    )
+    parser.addini(
+        'nplusone_threshold',
+        'Сколько одинаковых SQL-запросов за запрос допустимо', default='5'
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    for cache in caches.all():
+        cache.clear()
+    yield
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def eager_background_tasks(settings, tmp_path):
+    """
+    Фоновые задачи выполняются сразу, медиафайлы и метрики пишутся
+    во временный каталог, освободившиеся файлы удаляются без задержки.
+    """
+    settings.TASKS_EAGER = True
+    settings.MEDIA_RELEASE_GRACE = 0
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.METRICS_DIR = str(tmp_path / 'metrics')
+
+
+@pytest.fixture(autouse=True)
+def nplusone(settings, pytestconfig):
+    """Повтор одного SQL за запрос больше порога валит тест."""
+    settings.NPLUSONE_MODE = pytestconfig.getini('nplusone_mode')
+    settings.NPLUSONE_THRESHOLD = int(
+        pytestconfig.getini('nplusone_threshold')
+    )
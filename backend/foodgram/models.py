@@ -0,0 +1,29 @@
+"""Общие для приложений части моделей."""
+
+
+class CountersMixin:
+    """
+    Денормализованные счётчики COUNTER_FIELDS меняются только
+    F-выражениями (recipes.counters). Обычный save() существующей строки
+    их не пишет: значения, прочитанные раньше, затёрли бы параллельные
+    изменения. Чтобы записать счётчик, передайте его в update_fields.
+    """
+    COUNTER_FIELDS = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if (
+            update_fields is None and not force_insert
+            and not self._state.adding
+        ):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(
+            force_insert=force_insert, force_update=force_update,
+            using=using, update_fields=update_fields
+        )
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -20,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -29,9 +31,12 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'tasks.apps.TasksConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
+    'api.middleware.NPlusOneMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -73,6 +78,98 @@ DATABASES = {
     }
 }
 
+# Кэш должен быть общим у всех процессов, включая воркер очереди задач:
+# задачи сбрасывают версии кэша ответов (api.cache). Для FileBasedCache
+# каталоги LOCATION монтируются во все контейнеры (docker-compose.yml).
+# Версии данных и набор тегов хранятся в отдельном кэше versions, чтобы
+# вытеснение ответов при заполнении default (MAX_ENTRIES) их не задевало
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'
+)
+CACHE_LOCATION = os.getenv(
+    'CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 5000)),
+        },
+    },
+    'versions': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'VERSIONS_CACHE_LOCATION',
+            os.path.join(CACHE_LOCATION, 'versions')
+        ),
+        'KEY_PREFIX': 'versions',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('VERSIONS_CACHE_MAX_ENTRIES', 1000000)
+            ),
+        },
+    },
+}
+
+# Время жизни кэша ответов для анонимных пользователей (секунды)
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
+# Автодополнение ингредиентов из индекса в памяти (False — запросом к БД)
+INGREDIENT_SEARCH_INDEX = os.getenv(
+    'INGREDIENT_SEARCH_INDEX', 'True'
+) == 'True'
+
+# max-age для справочников тегов и ингредиентов (секунды)
+REFERENCE_DATA_MAX_AGE = int(os.getenv('REFERENCE_DATA_MAX_AGE', 60))
+
+# Список рецептов и избранное собираются из .values() (api.fast_read)
+RECIPE_READ_FAST_PATH = os.getenv('RECIPE_READ_FAST_PATH', 'True') == 'True'
+
+# Кэш выгрузок списка покупок: время жизни и максимальный размер файла
+SHOPPING_LIST_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_CACHE_TIMEOUT', 60 * 60)
+)
+SHOPPING_LIST_CACHE_MAX_BYTES = int(
+    os.getenv('SHOPPING_LIST_CACHE_MAX_BYTES', 1024 * 1024)
+)
+# TTF-шрифт с кириллицей для PDF (нужен пакет reportlab)
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Очередь задач (tasks): выполнение сразу без воркера, параллельность
+# воркера, число попыток, задержка первого повтора, таймаут зависшей
+# задачи (секунды) и период опроса очереди
+TASKS_EAGER = os.getenv('TASKS_EAGER', 'False') == 'True'
+TASK_WORKER_CONCURRENCY = int(os.getenv('TASK_WORKER_CONCURRENCY', 4))
+TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', 3))
+TASK_RETRY_DELAY = int(os.getenv('TASK_RETRY_DELAY', 10))
+TASK_LOCK_TIMEOUT = int(os.getenv('TASK_LOCK_TIMEOUT', 600))
+TASK_POLL_INTERVAL = float(os.getenv('TASK_POLL_INTERVAL', 1))
+
+# Метрики запросов (api.metrics): сбор, заголовок Server-Timing, каталог
+# файлов процессов (очищать при старте контейнера), период их записи
+# (секунды) и сети, из которых /api/metrics доступен без staff-прав
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True') == 'True'
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics')
+)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_INTERNAL_NETWORKS = os.getenv(
+    'METRICS_INTERNAL_NETWORKS',
+    '127.0.0.0/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16'
+).split(',')
+
+# Поиск N+1 (api.nplusone): режим off/log/raise, сколько одинаковых
+# запросов за запрос допустимо и доля проверяемых запросов в режиме log.
+# В тестах режим и порог задаются в pytest.ini
+NPLUSONE_MODE = os.getenv('NPLUSONE_MODE', 'log')
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 10))
+NPLUSONE_SAMPLE_RATE = float(os.getenv('NPLUSONE_SAMPLE_RATE', 0.01))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,6 +199,20 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Сколько секунд после записи или повторной загрузки блоб медиафайлов
+# не удаляется, даже если на него нет ссылок (recipes.media.release):
+# должно быть больше самой долгой транзакции с загрузкой картинки
+MEDIA_RELEASE_GRACE = int(os.getenv('MEDIA_RELEASE_GRACE', 600))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'foodgram.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -120,8 +231,14 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPagination',
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.FastJSONRenderer',
+    ] + (
+        ['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []
+    ),
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
@@ -0,0 +1,73 @@
+"""
+Хранилище медиафайлов с именами по содержимому (SHA-256).
+
+Одинаковые файлы хранятся один раз: если блоб с таким хешем уже есть,
+запись пропускается, а у файла обновляется время изменения. Содержимое
+файла по имени никогда не меняется, поэтому nginx отдаёт /media/
+с Cache-Control: immutable.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import time
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+HASH_NAME_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_content_addressed(name):
+    return bool(name) and HASH_NAME_RE.match(name) is not None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файл сохраняется как aa/bb/<sha256>.<расширение>; upload_to и имя,
+    пришедшее от клиента, влияют только на расширение. При гонке двух
+    одинаковых загрузок вторая получит суффикс от FileSystemStorage.
+    """
+
+    def hashed_name(self, name, content):
+        extension = posixpath.splitext(name)[1].lower()
+        digest = content_hash(content)
+        return f'{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        try:
+            # Блоб уже есть: свежее время изменения не даёт
+            # delete_if_stale удалить его, пока строка с ним не записана
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super()._save(name, content)
+        return name
+
+    def delete_if_stale(self, name, age):
+        """
+        Удаляет файл, если его не записывали и не трогали age секунд.
+        Файл сначала переименовывается: загрузка того же содержимого либо
+        успеет обновить время до этого, и файл вернётся на место, либо
+        не найдёт его и запишет заново. Возвращает True, если удалил.
+        """
+        path = self.path(name)
+        aside = f'{path}.{uuid.uuid4().hex}.deleting'
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return False
+        if time.time() - os.stat(aside).st_mtime < age:
+            # Содержимое то же, поэтому можно заменить файл, который
+            # успели записать заново
+            os.replace(aside, path)
+            return False
+        os.remove(aside)
+        return True
@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from .models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag,
+    UnitConversion
 )
 
 
@@ -13,16 +14,15 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'pub_date', 'favorites_count')
+    list_display = (
+        'name', 'author', 'pub_date',
+        'favorites_count', 'shopping_carts_count'
+    )
     search_fields = ('name', 'author__username')
     list_filter = ('tags',)
-    readonly_fields = ('favorites_count',)
+    readonly_fields = ('favorites_count', 'shopping_carts_count')
     inlines = (RecipeIngredientInline,)
 
-    def favorites_count(self, obj):
-        return obj.in_favorites.count()
-    favorites_count.short_description = 'Добавлено в избранное'
-
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -33,7 +33,7 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
-    list_display = ('name', 'measurement_unit')
+    list_display = ('name', 'measurement_unit', 'density')
     search_fields = ('name',)
     list_filter = ('name',)
 
@@ -51,3 +51,9 @@ class FavoriteAdmin(admin.ModelAdmin):
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+
+
+@admin.register(UnitConversion)
+class UnitConversionAdmin(admin.ModelAdmin):
+    list_display = ('unit', 'base_unit', 'factor')
+    search_fields = ('unit',)
@@ -0,0 +1,81 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+# Денормализованный счётчик: (модель-владелец, поле счётчика,
+# связанная модель, поле связи с владельцем).
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+    (User, 'following_count', Subscription, 'user'),
+)
+
+
+def adjust_counter(model, field, pks, delta):
+    """
+    Атомарно меняет счётчик на delta через F-выражение.
+    Вызывать в той же транзакции, что и запись связанных объектов.
+    """
+    if not pks or not delta:
+        return 0
+    return model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def adjust_related_counters(related_model, instances, delta):
+    """
+    Меняет все счётчики, которые зависят от related_model.
+    Владельцы с одинаковым числом объектов обновляются одним запросом.
+    """
+    for model, field, counted_model, fk in COUNTERS:
+        if counted_model is not related_model:
+            continue
+        per_owner = Counter(getattr(obj, f'{fk}_id') for obj in instances)
+        for times in set(per_owner.values()):
+            adjust_counter(
+                model, field,
+                {pk for pk, count in per_owner.items() if count == times},
+                delta * times
+            )
+
+
+def actual_count(counted_model, fk):
+    return Coalesce(
+        Subquery(
+            counted_model.objects.filter(
+                **{fk: OuterRef('pk')}
+            ).order_by().values(fk).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        Value(0)
+    )
+
+
+def reconcile_counters():
+    """
+    Пересчитывает счётчики по связанным таблицам.
+    Возвращает количество исправленных строк по каждому счётчику.
+    """
+    fixed = {}
+    for model, field, counted_model, fk in COUNTERS:
+        actual = actual_count(counted_model, fk)
+        drifted = model.objects.annotate(
+            actual=actual
+        ).exclude(**{field: F('actual')}).values('pk')
+        fixed[f'{model._meta.model_name}.{field}'] = (
+            model.objects.filter(pk__in=Subquery(drifted)).update(
+                **{field: actual}
+            )
+        )
+    return fixed
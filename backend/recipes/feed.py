@@ -0,0 +1,116 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q
+
+from api.constants import (
+    FEED_BACKFILL_RECIPES, FEED_FANOUT_MAX_FOLLOWERS,
+    FEED_FANOUT_SYNC_FOLLOWERS,
+)
+from recipes.models import FeedEntry, Recipe
+from tasks.queue import enqueue, task
+from users.models import Subscription
+
+User = get_user_model()
+
+FANOUT_BATCH_SIZE = 1000
+FEED_ORDERING = ('-feed_pub_date', '-id')
+
+# Авторы, чьи рецепты подмешиваются в ленту при чтении. Порог ниже
+# порога записи вдвое: рецепт, разложенный не по всем лентам, пока у
+# автора было много подписчиков, не пропадёт при небольшой отписке.
+READ_FANOUT_MIN_FOLLOWERS = FEED_FANOUT_MAX_FOLLOWERS // 2
+
+
+@task
+def fan_out_recipe(recipe_id):
+    """Раскладывает рецепт по лентам подписчиков автора."""
+    recipe = (
+        Recipe.objects
+        .filter(pk=recipe_id)
+        .values('pk', 'pub_date', 'author_id', 'author__followers_count')
+        .first()
+    )
+    if (
+        recipe is None
+        or recipe['author__followers_count'] > FEED_FANOUT_MAX_FOLLOWERS
+    ):
+        return
+    follower_ids = (
+        Subscription.objects
+        .filter(author_id=recipe['author_id'])
+        .values_list('user_id', flat=True)
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+    batch = []
+    for user_id in follower_ids:
+        batch.append(FeedEntry(
+            user_id=user_id, recipe_id=recipe['pk'],
+            pub_date=recipe['pub_date']
+        ))
+        if len(batch) == FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def schedule_fan_out(recipe):
+    """
+    Немногих подписчиков обслуживает сразу, остальных — через очередь.
+    Вызывать после коммита транзакции с рецептом.
+    """
+    followers_count = (
+        User.objects
+        .filter(pk=recipe.author_id)
+        .values_list('followers_count', flat=True)
+        .first()
+    )
+    if not followers_count or followers_count > FEED_FANOUT_MAX_FOLLOWERS:
+        return
+    if followers_count <= FEED_FANOUT_SYNC_FOLLOWERS:
+        fan_out_recipe(recipe.pk)
+    else:
+        enqueue(fan_out_recipe, recipe.pk)
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+    recipes = (
+        Recipe.objects
+        .filter(author_id=author_id)
+        .order_by('-pub_date', '-id')
+        .values_list('pk', 'pub_date')[:FEED_BACKFILL_RECIPES]
+    )
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, recipe_id=pk, pub_date=pub_date)
+            for pk, pub_date in recipes
+        ],
+        ignore_conflicts=True
+    )
+
+
+def remove_from_feed(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def feed_queryset(user):
+    """
+    Рецепты ленты с аннотацией feed_pub_date для FEED_ORDERING.
+    Обычно лента читается по индексу FeedEntry; если среди подписок
+    есть популярные авторы, их рецепты подмешиваются при чтении.
+    """
+    popular_authors = list(Subscription.objects.filter(
+        user=user,
+        author__followers_count__gt=READ_FANOUT_MIN_FOLLOWERS
+    ).values_list('author_id', flat=True))
+    if not popular_authors:
+        return Recipe.objects.filter(feed_entries__user=user).annotate(
+            feed_pub_date=F('feed_entries__pub_date')
+        )
+    timeline = FeedEntry.objects.filter(user=user).values('recipe_id')
+    return Recipe.objects.filter(
+        Q(pk__in=timeline) | Q(author__in=popular_authors)
+    ).annotate(feed_pub_date=F('pub_date'))
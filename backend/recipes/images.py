@@ -0,0 +1,120 @@
+"""
+Уменьшенные копии картинок рецептов и аватаров (JPEG/PNG и WebP).
+
+Варианты хранятся в JSON-поле <поле>_variants:
+{'source': имя исходного файла, 'variants': [{'width', 'format', 'name'}]}.
+Если source не совпадает с текущим файлом, варианты устарели.
+"""
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from api.cache import bump_catalog_version
+from recipes.media import find_variants, release
+from tasks.queue import task
+
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANTS_DIR = 'variants'
+WEBP = 'webp'
+SAVE_OPTIONS = {
+    'jpeg': {'quality': 85, 'optimize': True, 'progressive': True},
+    'png': {'optimize': True},
+    WEBP: {'quality': 80, 'method': 4},
+}
+
+
+def variants_field(field_name):
+    return f'{field_name}_variants'
+
+
+def is_stale(name, variants):
+    """Нужно ли пересобрать варианты для файла name."""
+    return bool(name) and (variants or {}).get('source') != name
+
+
+def _encode(image, file_format):
+    if file_format == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, file_format.upper(), **SAVE_OPTIONS[file_format])
+    return ContentFile(buffer.getvalue())
+
+
+def build_variants(storage, name):
+    """Сохраняет уменьшенные копии файла name и возвращает их описание."""
+    with storage.open(name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    fallback = 'png' if has_alpha else 'jpeg'
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    directory = posixpath.join(posixpath.dirname(name), VARIANTS_DIR)
+    widths = sorted({min(width, image.width) for width in VARIANT_WIDTHS})
+    variants = []
+    for width in widths:
+        resized = image
+        if width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+        for file_format in (fallback, WEBP):
+            extension = 'jpg' if file_format == 'jpeg' else file_format
+            saved = storage.save(
+                posixpath.join(directory, f'{stem}_{width}.{extension}'),
+                _encode(resized, file_format)
+            )
+            variants.append(
+                {'width': width, 'format': file_format, 'name': saved}
+            )
+    return {'source': name, 'variants': variants}
+
+
+def refresh_variants(model, pk, field_name):
+    """
+    Пересобирает варианты картинки объекта, если они устарели; варианты
+    того же файла у другой строки используются повторно. Пишет через
+    update() (без сигналов) и только если картинку не сменили за время
+    обработки. Возвращает True, если записал.
+    """
+    field = variants_field(field_name)
+    row = model.objects.filter(pk=pk).values(field_name, field).first()
+    if row is None or not is_stale(row[field_name], row[field]):
+        return False
+    name = row[field_name]
+    variants = find_variants(name) or build_variants(
+        model._meta.get_field(field_name).storage, name
+    )
+    updated = model.objects.filter(
+        pk=pk, **{field_name: name}
+    ).update(**{field: variants})
+    if not updated:
+        release(name, variants)
+    return bool(updated)
+
+
+@task
+def process_image(model_label, pk, field_name):
+    """Задача очереди: варианты картинки и сброс кэша каталога."""
+    if refresh_variants(apps.get_model(model_label), pk, field_name):
+        bump_catalog_version()
+
+
+def image_set(storage, name, variants, request=None):
+    """
+    srcset для <picture>: {'srcset': 'url 320w, ...', 'webp': '...'}.
+    None, пока варианты для текущего файла name не готовы.
+    """
+    if not name or is_stale(name, variants):
+        return None
+    sources = {}
+    for variant in variants['variants']:
+        url = storage.url(variant['name'])
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        key = WEBP if variant['format'] == WEBP else 'srcset'
+        sources.setdefault(key, []).append(f'{url} {variant["width"]}w')
+    return {key: ', '.join(items) for key, items in sources.items()}
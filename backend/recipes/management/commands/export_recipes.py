@@ -0,0 +1,81 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from recipes.models import Recipe, RecipeIngredient
+
+CHUNK_SIZE = 1000
+AUTHOR_FIELDS = ('username', 'email', 'first_name', 'last_name')
+TAG_FIELDS = ('name', 'color', 'slug')
+
+
+def recipe_line(recipe):
+    """Рецепт одной строкой JSON Lines; связи — по естественным ключам."""
+    return json.dumps({
+        'id': recipe.pk,
+        'author': {
+            field: getattr(recipe.author, field) for field in AUTHOR_FIELDS
+        },
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': recipe.image.name,
+        'tags': [
+            {field: getattr(tag, field) for field in TAG_FIELDS}
+            for tag in recipe.tags.all()
+        ],
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in recipe.recipeingredient_set.all()
+        ],
+    }, ensure_ascii=False)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает рецепты с авторами, тегами, ингредиентами и именами '
+        'картинок в формате JSON Lines (по рецепту в строке)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', help='Файл для выгрузки; "-" — стандартный вывод'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Сколько рецептов читать из базы за раз'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('pk')
+            )
+        ).iterator(chunk_size=options['chunk_size'])
+        if options['output'] == '-':
+            count = self.write(recipes, sys.stdout)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                count = self.write(recipes, output)
+        self.stderr.write(self.style.SUCCESS(f'Выгружено рецептов: {count}'))
+
+    def write(self, recipes, output):
+        count = 0
+        for recipe in recipes:
+            output.write(recipe_line(recipe))
+            output.write('\n')
+            count += 1
+        return count
@@ -0,0 +1,309 @@
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from api.cache import (
+    bump_catalog_version, bump_ingredients_version, bump_tags_version,
+    invalidate_tag_universe
+)
+from recipes.counters import adjust_related_counters
+from recipes.management.commands.export_recipes import (
+    AUTHOR_FIELDS, TAG_FIELDS
+)
+from recipes.management.commands.load_ingrs import batched
+from recipes.media import release
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.search import refresh_search_vectors
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+
+
+def read_lines(file):
+    """Рецепты из JSON Lines по одному; пустые строки пропускаются."""
+    for number, line in enumerate(file, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as err:
+                raise CommandError(f'Строка {number}: {err}')
+
+
+def copy_image(media_from, name):
+    """(старое имя, новое имя или None, если файла нет)."""
+    path = os.path.join(media_from, name)
+    if not os.path.isfile(path):
+        return name, None
+    with open(path, 'rb') as source:
+        return name, default_storage.save(name, File(source))
+
+
+def amounts(items, ingredients):
+    """{pk ингредиента: количество}; неизвестные ингредиенты пропускаются."""
+    result = {}
+    for item in items:
+        key = (item['name'], item['measurement_unit'])
+        if key in ingredients:
+            result[ingredients[key]] = item['amount']
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает рецепты из JSON Lines, выгруженных export_recipes: '
+        'пачками через bulk_create, с созданием недостающих авторов, '
+        'тегов и ингредиентов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', help='Файл с рецептами; "-" — стандартный ввод'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько рецептов сохранять в одной транзакции'
+        )
+        parser.add_argument(
+            '--media-from',
+            help='Каталог MEDIA_ROOT источника: картинки копируются из него'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число потоков копирования картинок'
+        )
+        parser.add_argument(
+            '--id-map',
+            help='CSV-файл для соответствия старых и новых id рецептов'
+        )
+
+    def handle(self, *args, **options):
+        self.stats = dict.fromkeys(
+            ('created', 'skipped', 'authors', 'tags', 'ingredients'), 0
+        )
+        self.missing_images = 0
+        id_map = None
+        if options['id_map']:
+            id_map_file = open(
+                options['id_map'], 'w', encoding='utf-8', newline=''
+            )
+            id_map = csv.writer(id_map_file)
+            id_map.writerow(('old_id', 'new_id'))
+        if options['input'] == '-':
+            source = sys.stdin
+        else:
+            source = open(options['input'], encoding='utf-8')
+        executor = None
+        if options['media_from']:
+            executor = ThreadPoolExecutor(max(1, options['workers']))
+        try:
+            for batch in batched(read_lines(source), options['batch_size']):
+                self.copied = []
+                try:
+                    with transaction.atomic():
+                        remap = self.import_batch(
+                            batch, options['media_from'], executor
+                        )
+                except Exception:
+                    # Файлы откатившейся пачки никому не нужны
+                    for name in self.copied:
+                        release(name)
+                    raise
+                if id_map is not None:
+                    id_map.writerows(remap.items())
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if id_map is not None:
+                id_map_file.close()
+            if executor is not None:
+                executor.shutdown()
+            self.invalidate()
+        if self.missing_images:
+            self.stderr.write(
+                f'Не найдено картинок в источнике: {self.missing_images}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Импорт завершён! Создано рецептов: {created}, пропущено '
+            'существующих: {skipped}, новых авторов: {authors}, '
+            'тегов: {tags}, ингредиентов: {ingredients}'.format(**self.stats)
+        ))
+        if self.stats['created']:
+            self.stdout.write(
+                'Уменьшенные копии картинок: manage.py make_image_variants'
+            )
+
+    def invalidate(self):
+        if not self.stats['created']:
+            return
+        bump_catalog_version()
+        invalidate_tag_universe()
+        if self.stats['tags']:
+            bump_tags_version()
+        if self.stats['ingredients']:
+            bump_ingredients_version()
+
+    def resolve(self, model, key_fields, rows, build, stat):
+        """
+        {ключ: pk} для строк по естественному ключу; недостающие
+        создаются одним bulk_create. Строки, конфликтующие с другими
+        уникальными полями, не создаются и в ответ не попадают.
+        """
+        rows = {tuple(row[field] for field in key_fields): row for row in rows}
+        lookup = {f'{key_fields[0]}__in': {key[0] for key in rows}}
+
+        def existing():
+            return {
+                values[:-1]: values[-1]
+                for values in model.objects.filter(**lookup).values_list(
+                    *key_fields, 'pk'
+                )
+                if values[:-1] in rows
+            }
+
+        found = existing()
+        missing = [build(row) for key, row in rows.items() if key not in found]
+        if missing:
+            model.objects.bulk_create(missing, ignore_conflicts=True)
+            before = len(found)
+            found = existing()
+            self.stats[stat] += len(found) - before
+        return found
+
+    def import_batch(self, batch, media_from, executor):
+        """Сохраняет пачку рецептов; возвращает {старый id: новый id}."""
+        authors = self.resolve(
+            User, ('username',),
+            [line['author'] for line in batch],
+            lambda row: User(
+                password=make_password(None),
+                **{field: row[field] for field in AUTHOR_FIELDS}
+            ),
+            'authors'
+        )
+        tags = self.resolve(
+            Tag, ('slug',),
+            [tag for line in batch for tag in line['tags']],
+            lambda row: Tag(**{field: row[field] for field in TAG_FIELDS}),
+            'tags'
+        )
+        ingredients = self.resolve(
+            Ingredient, ('name', 'measurement_unit'),
+            [item for line in batch for item in line['ingredients']],
+            lambda row: Ingredient(
+                name=row['name'], measurement_unit=row['measurement_unit']
+            ),
+            'ingredients'
+        )
+        lines = []
+        for line in batch:
+            author_id = authors.get((line['author']['username'],))
+            if author_id is None:
+                self.stderr.write(
+                    f'Рецепт {line["id"]}: не удалось создать автора '
+                    f'{line["author"]["username"]}'
+                )
+                self.stats['skipped'] += 1
+                continue
+            lines.append((author_id, line))
+        existing = set(Recipe.objects.filter(
+            author_id__in={author_id for author_id, _ in lines},
+            name__in={line['name'] for _, line in lines}
+        ).values_list('author_id', 'name'))
+        seen = set()
+        new_lines = []
+        for author_id, line in lines:
+            key = (author_id, line['name'])
+            if key in existing or key in seen:
+                self.stats['skipped'] += 1
+                continue
+            seen.add(key)
+            new_lines.append((author_id, line))
+        if not new_lines:
+            return {}
+        images = self.copy_images(
+            [line['image'] for _, line in new_lines], media_from, executor
+        )
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                author_id=author_id,
+                name=line['name'],
+                text=line['text'],
+                cooking_time=line['cooking_time'],
+                image=self.image_name(line, images, media_from),
+            )
+            for author_id, line in new_lines
+        ])
+        # auto_now_add перезаписывает дату при вставке
+        for recipe, (_, line) in zip(recipes, new_lines):
+            recipe.pub_date = parse_datetime(line['pub_date'])
+        Recipe.objects.bulk_update(recipes, ['pub_date'])
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe, (_, line) in zip(recipes, new_lines)
+            for tag_id in {
+                tags[(tag['slug'],)] for tag in line['tags']
+                if (tag['slug'],) in tags
+            }
+        ], ignore_conflicts=True)
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe.pk, ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for recipe, (_, line) in zip(recipes, new_lines)
+            for ingredient_id, amount in amounts(
+                line['ingredients'], ingredients
+            ).items()
+        ])
+        adjust_related_counters(Recipe, recipes, 1)
+        refresh_search_vectors(
+            Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes])
+        )
+        self.stats['created'] += len(recipes)
+        return {
+            line['id']: recipe.pk
+            for recipe, (_, line) in zip(recipes, new_lines)
+        }
+
+    def copy_images(self, names, media_from, executor):
+        """{старое имя: новое имя} для картинок, скопированных в хранилище."""
+        if not media_from:
+            return {}
+        copied = {}
+        for old, new in executor.map(
+            lambda name: copy_image(media_from, name), set(filter(None, names))
+        ):
+            if new is None:
+                self.missing_images += 1
+            else:
+                copied[old] = new
+        self.copied.extend(copied.values())
+        return copied
+
+    def image_name(self, line, images, media_from):
+        """
+        Имя картинки рецепта в этом хранилище. Без --media-from файлы
+        считаются общими с источником; картинки, которых нет в
+        источнике, не сохраняются.
+        """
+        if not media_from:
+            return line['image']
+        if line['image'] in images:
+            return images[line['image']]
+        if line['image']:
+            self.stderr.write(
+                f'Рецепт {line["id"]}: нет картинки {line["image"]}, '
+                f'сохранён без неё'
+            )
+        return ''
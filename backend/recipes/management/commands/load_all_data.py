@@ -1,6 +1,7 @@
 import os
 
 from django.conf import settings
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 
 
@@ -30,8 +31,6 @@ class Command(BaseCommand):
             )
 
         self.stdout.write(self.style.SUCCESS('Загрузка ингредиентов...'))
-        from recipes.management.commands.load_ingrs import Command as LoadIngrs
-        from recipes.management.commands.load_tags import Command as LoadTags
-        LoadIngrs().handle()
-        LoadTags().handle()
+        call_command('load_ingrs')
+        call_command('load_tags')
         self.stdout.write(self.style.SUCCESS('Готово!'))
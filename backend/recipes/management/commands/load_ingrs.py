@@ -1,129 +1,221 @@
 import csv
+import hashlib
 import json
 import os
+import tempfile
+from itertools import islice
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+
+from api.cache import bump_ingredients_version
+from recipes.models import DataImport, Ingredient
+from recipes.units import apply_default_densities
+
+SOURCE = 'ingredients'
+FILES = ('ingredients.json', 'ingredients.csv')
+BATCH_SIZE = 1000
+# Меняется вместе с логикой загрузки, чтобы контрольная сумма не совпала
+LOADER_VERSION = b'2'
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(file, chunk_size=JSON_CHUNK_SIZE):
+    """Объекты JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    expect = '['
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError('JSON-файл оборван')
+            buffer, pos = file.read(chunk_size), 0
+            eof = not buffer
+            continue
+        char = buffer[pos]
+        if expect == '[':
+            if char != '[':
+                raise ValueError('Ожидался JSON-массив')
+            pos += 1
+            expect = 'first'
+        elif char == ']' and expect in ('first', ','):
+            return
+        elif expect == ',':
+            if char != ',':
+                raise ValueError('Ожидалась запятая между элементами')
+            pos += 1
+            expect = 'value'
+        else:
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            expect = ','
+            yield item
 
-from recipes.models import Ingredient
 
+def json_rows(path):
+    with open(path, encoding='utf-8') as file:
+        for item in iter_json_array(file):
+            yield item['name'], item['measurement_unit']
 
-class Command(BaseCommand):
-    help = (
-        'Загружает ингредиенты из файлов '
-        'data/ingredients.json и data/ingredients.csv'
-    )
 
-    def handle(self, *args, **kwargs):
-        data_dir = os.path.join(settings.BASE_DIR, 'data')
-        created_count = 0
+def csv_rows(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if len(row) >= 2:
+                yield row[0], row[1]
 
-        # Загрузка из JSON
-        json_file = os.path.join(data_dir, 'ingredients.json')
-        if os.path.exists(json_file):
-            self.stdout.write(f'Загружаем ингредиенты из {json_file}...')
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    ingredients_data = json.load(f)
 
-                self.stdout.write(
-                    f'Найдено {len(ingredients_data)} '
-                    'ингредиентов в JSON-файле'
-                )
+READERS = {'.json': json_rows, '.csv': csv_rows}
 
-                try:
-                    for item in ingredients_data:
-                        ingredient, created = Ingredient.objects.get_or_create(
-                            name=item['name'],
-                            measurement_unit=item['measurement_unit'],
-                            defaults=item
-                        )
-                        if created:
-                            created_count += 1
-
-                    self.stdout.write(
-                        f'Из JSON-файла создано '
-                        f'{created_count} новых ингредиентов'
-                    )
-                except Exception as err:
-                    self.stdout.write(
-                        f'Ошибка при работе с базой данных: {err}'
-                    )
-                    self.stdout.write(
-                        'Файл JSON читается корректно, '
-                        'но база данных недоступна'
-                    )
 
-            except Exception as err:
-                self.stdout.write(
-                    f'Ошибка при чтении JSON-файла: {err}'
-                )
-        else:
-            self.stdout.write(f'Файл {json_file} не найден')
+def file_checksum(paths):
+    digest = hashlib.sha256(LOADER_VERSION)
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(JSON_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
 
-        # Загрузка из CSV
-        csv_file = os.path.join(data_dir, 'ingredients.csv')
-        if os.path.exists(csv_file):
-            self.stdout.write(f'Загружаем ингредиенты из {csv_file}...')
-            try:
-                csv_created = 0
-                csv_total = 0
-
-                with open(csv_file, 'r', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    for row in reader:
-                        csv_total += 1
-                        if len(row) < 2:
-                            continue
-
-                        name = row[0].strip()
-                        unit = row[1].strip()
-
-                        try:
-                            _, created = Ingredient.objects.get_or_create(
-                                name=name,
-                                measurement_unit=unit,
-                                defaults={
-                                    'name': name,
-                                    'measurement_unit': unit,
-                                }
-                            )
-                            if created:
-                                csv_created += 1
-                        except Exception:
-                            continue
-
-                self.stdout.write(
-                    f'Найдено {csv_total} '
-                    'строк в CSV-файле'
-                )
-                self.stdout.write(
-                    f'Из CSV-файла создано '
-                    f'{csv_created} новых ингредиентов'
-                )
-                created_count += csv_created
 
-            except Exception as err:
-                self.stdout.write(
-                    f'Ошибка при чтении CSV-файла: {err}'
-                )
-        else:
-            self.stdout.write(f'Файл {csv_file} не найден')
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из файлов '
+        'data/ingredients.json и data/ingredients.csv'
+    )
 
-        # Итоговый отчёт
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--data-dir', default=os.path.join(settings.BASE_DIR, 'data'),
+            help='Каталог с файлами ингредиентов'
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='PostgreSQL: COPY во временную таблицу и INSERT ON CONFLICT'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Загрузить, даже если файлы не менялись'
+        )
+
+    def handle(self, *args, **options):
+        paths = []
+        for name in FILES:
+            path = os.path.join(options['data_dir'], name)
+            if os.path.exists(path):
+                paths.append(path)
+            else:
+                self.stdout.write(f'Файл {path} не найден')
+        if not paths:
+            return
         try:
-            total = Ingredient.objects.count()
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'Загрузка завершена! '
-                    f'Создано новых ингредиентов: {created_count}, '
-                    f'всего в базе: {total}'
-                )
+            self.load(paths, options)
+        except (OSError, ValueError, KeyError, DatabaseError) as err:
+            self.stderr.write(f'Ошибка загрузки ингредиентов: {err!r}')
+
+    def rows(self, paths):
+        """Уникальные (название, единица) из всех файлов по порядку."""
+        max_length = Ingredient._meta.get_field('name').max_length
+        seen = set()
+        self.skipped = 0
+        for path in paths:
+            self.stdout.write(f'Загружаем ингредиенты из {path}...')
+            reader = READERS[os.path.splitext(path)[1]]
+            for name, unit in reader(path):
+                key = (str(name).strip(), str(unit).strip())
+                if key in seen:
+                    continue
+                if not all(key) or max(map(len, key)) > max_length:
+                    self.skipped += 1
+                    continue
+                seen.add(key)
+                yield key
+        self.unique = len(seen)
+
+    def load(self, paths, options):
+        checksum = file_checksum(paths)
+        loaded = DataImport.objects.filter(
+            source=SOURCE, checksum=checksum
+        ).values_list('rows', flat=True).first()
+        if (
+            not options['force'] and loaded is not None
+            and Ingredient.objects.count() >= loaded
+        ):
+            self.stdout.write(self.style.SUCCESS(
+                'Ингредиенты уже загружены, файлы не менялись.'
+            ))
+            return
+        use_copy = options['copy'] and connection.vendor == 'postgresql'
+        if options['copy'] and not use_copy:
+            self.stdout.write('COPY доступен только для PostgreSQL.')
+        with transaction.atomic():
+            before = Ingredient.objects.count()
+            if use_copy:
+                self.copy_rows(self.rows(paths))
+            else:
+                for batch in batched(self.rows(paths), BATCH_SIZE):
+                    Ingredient.objects.bulk_create(
+                        [
+                            Ingredient(name=name, measurement_unit=unit)
+                            for name, unit in batch
+                        ],
+                        ignore_conflicts=True
+                    )
+            created = Ingredient.objects.count() - before
+            densities = apply_default_densities(Ingredient.objects.all())
+            DataImport.objects.update_or_create(
+                source=SOURCE,
+                defaults={'checksum': checksum, 'rows': self.unique}
             )
-        except Exception:
+            if created or densities:
+                transaction.on_commit(bump_ingredients_version)
+        if self.skipped:
+            self.stdout.write(f'Пропущено некорректных строк: {self.skipped}')
+        if densities:
             self.stdout.write(
-                self.style.SUCCESS(
-                    f'Файлы прочитаны успешно! '
-                    f'Создано новых ингредиентов: {created_count}'
-                )
+                f'Проставлена плотность для {densities} ингредиентов'
             )
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка завершена! Уникальных строк: {self.unique}, '
+            f'создано новых ингредиентов: {created}, '
+            f'всего в базе: {before + created}'
+        ))
+
+    def copy_rows(self, rows):
+        """COPY во временную таблицу и один INSERT ... ON CONFLICT."""
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with tempfile.SpooledTemporaryFile(
+            mode='w+', encoding='utf-8', newline=''
+        ) as buffer:
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'CREATE TEMP TABLE ingredient_import '
+                    '(name text, measurement_unit text) ON COMMIT DROP'
+                )
+                cursor.cursor.copy_expert(
+                    'COPY ingredient_import FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+                cursor.execute(
+                    f'INSERT INTO {table} (name, measurement_unit) '
+                    'SELECT name, measurement_unit FROM ingredient_import '
+                    'ON CONFLICT DO NOTHING'
+                )
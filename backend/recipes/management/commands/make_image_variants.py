@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.cache import bump_catalog_version
+from recipes.images import is_stale, refresh_variants, variants_field
+from recipes.models import Recipe
+
+User = get_user_model()
+
+IMAGE_FIELDS = ((Recipe, 'image'), (User, 'avatar'))
+
+
+def _refresh(job):
+    """(записано ли, текст ошибки) для одной картинки."""
+    try:
+        return refresh_variants(*job), None
+    except Exception as error:
+        return False, f'{job[0].__name__} {job[1]}: {error}'
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные копии и WebP для картинок рецептов '
+        'и аватаров, у которых их ещё нет'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число потоков обработки'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересобрать варианты для всех картинок'
+        )
+
+    def handle(self, *args, **options):
+        jobs = []
+        for model, field_name in IMAGE_FIELDS:
+            field = variants_field(field_name)
+            if options['force']:
+                model.objects.exclude(**{field_name: ''}).update(
+                    **{field: {}}
+                )
+            rows = model.objects.exclude(
+                **{f'{field_name}__isnull': True}
+            ).exclude(**{field_name: ''}).values_list(
+                'pk', field_name, field
+            ).iterator()
+            jobs += [
+                (model, pk, field_name)
+                for pk, name, variants in rows if is_stale(name, variants)
+            ]
+        self.stdout.write(f'Картинок к обработке: {len(jobs)}')
+        done = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for updated, error in pool.map(_refresh, jobs):
+                done += updated
+                if error:
+                    self.stderr.write(error)
+        if done:
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Обработано картинок: {done}'))
@@ -0,0 +1,82 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_catalog_version
+from foodgram.storage import is_content_addressed
+from recipes.media import MEDIA_FIELDS, reference_count
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки рецептов, аватары и их варианты в хранилище '
+        'с именами по содержимому и удаляет старые файлы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-old', action='store_true',
+            help='Не удалять файлы со старыми именами'
+        )
+
+    def handle(self, *args, **options):
+        self.moved = {}
+        rows = 0
+        for model, field_name in MEDIA_FIELDS:
+            field = f'{field_name}_variants'
+            queryset = model.objects.exclude(
+                **{f'{field_name}__isnull': True}
+            ).exclude(**{field_name: ''})
+            for pk, name, variants in queryset.values_list(
+                'pk', field_name, field
+            ).iterator():
+                changes = self.rehome_row(name, variants, field_name, field)
+                if changes:
+                    rows += model.objects.filter(
+                        pk=pk, **{field_name: name}
+                    ).update(**changes)
+        if rows:
+            bump_catalog_version()
+        removed = 0
+        if not options['keep_old']:
+            for old in self.moved:
+                if not reference_count(old):
+                    default_storage.delete(old)
+                    removed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено строк: {rows}, перенесено файлов: '
+            f'{len(self.moved)}, удалено старых: {removed}'
+        ))
+
+    def rehome(self, name):
+        """Новое имя файла или None, если файла нет."""
+        if is_content_addressed(name):
+            return name
+        if name not in self.moved:
+            if not default_storage.exists(name):
+                self.stderr.write(f'Нет файла {name}')
+                return None
+            with default_storage.open(name) as content:
+                self.moved[name] = default_storage.save(name, content)
+        return self.moved[name]
+
+    def rehome_row(self, name, variants, field_name, field):
+        new_name = self.rehome(name)
+        if new_name is None:
+            return None
+        changes = {}
+        if new_name != name:
+            changes[field_name] = new_name
+        if variants and variants.get('source') == name:
+            rehomed = [
+                dict(variant, name=self.rehome(variant['name']))
+                for variant in variants.get('variants', ())
+            ]
+            if all(variant['name'] for variant in rehomed):
+                new_variants = {'source': new_name, 'variants': rehomed}
+            else:
+                new_variants = {}
+            if new_variants != variants:
+                changes[field] = new_variants
+        elif variants:
+            changes[field] = {}
+        return changes
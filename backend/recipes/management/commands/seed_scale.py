@@ -0,0 +1,360 @@
+import bisect
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from api.cache import (
+    bump_catalog_version, bump_ingredients_version, bump_tags_version,
+    invalidate_tag_universe
+)
+from api.constants import FEED_FANOUT_MAX_FOLLOWERS
+from recipes.counters import reconcile_counters
+from recipes.feed import backfill_feed
+from recipes.models import (
+    Favorite, FeedEntry, Ingredient, Recipe, RecipeIngredient,
+    ShoppingCart, Tag
+)
+from recipes.search import refresh_search_vectors
+from users.models import Subscription
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+# Сколько заданий приходится на один процесс: мелкие задания
+# выравнивают нагрузку, когда процессы заканчивают неравномерно.
+JOBS_PER_WORKER = 4
+TAGS_PER_RECIPE = (1, 3)
+INGREDIENTS_PER_RECIPE = (3, 10)
+AMOUNT_RANGE = (1, 1000)
+COOKING_TIME_RANGE = (5, 180)
+PUB_DATE_SPREAD = timedelta(days=365)
+# Когда пары почти исчерпаны, выборка останавливается после стольких
+# попыток на строку
+MAX_ATTEMPTS_PER_ROW = 20
+RELATIONS = (
+    ('favorites', Favorite, 'user', 'recipe'),
+    ('carts', ShoppingCart, 'user', 'recipe'),
+    ('subscriptions', Subscription, 'user', 'author'),
+)
+
+# Выборки id, загруженные в этом процессе: {(вид, параметры): ZipfSampler}
+_samplers = {}
+
+
+class ZipfSampler:
+    """
+    Случайные id, где k-й по популярности выпадает с весом 1 / k**s.
+    Ранги назначаются перемешиванием с фиксированным seed, поэтому во
+    всех процессах одни и те же id популярны и не совпадают с порядком pk.
+    """
+
+    def __init__(self, ids, exponent, seed):
+        self.ids = list(ids)
+        random.Random(seed).shuffle(self.ids)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.ids) + 1)
+        ))
+
+    def sample(self, rng):
+        return self.ids[bisect.bisect(
+            self.cum_weights, rng.random() * self.cum_weights[-1],
+            hi=len(self.ids) - 1
+        )]
+
+
+def _sampler(kind, params):
+    key = (kind, params['prefix'], params['exponent'], params['seed'])
+    if key not in _samplers:
+        if kind == 'users':
+            ids = User.objects.filter(username__startswith=params['prefix'])
+        else:
+            ids = Recipe.objects.filter(
+                author__username__startswith=params['prefix']
+            )
+        _samplers[key] = ZipfSampler(
+            ids.order_by('pk').values_list('pk', flat=True).iterator(),
+            params['exponent'], params['seed']
+        )
+    return _samplers[key]
+
+
+def _bulk(model, rows, ignore_conflicts=True):
+    return model.objects.bulk_create(
+        rows, batch_size=BATCH_SIZE, ignore_conflicts=ignore_conflicts
+    )
+
+
+def seed_users(start, stop, rng, params):
+    _bulk(User, [
+        User(
+            username=f'{params["prefix"]}{number}',
+            email=f'{params["prefix"]}{number}@example.com',
+            first_name=f'Имя {number}',
+            last_name=f'Фамилия {number}',
+            password=params['password'],
+        )
+        for number in range(start, stop)
+    ])
+
+
+def seed_recipes(start, stop, rng, params):
+    authors = _sampler('users', params)
+    tag_ids = list(Tag.objects.values_list('pk', flat=True))
+    ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+    now = timezone.now()
+    for batch_start in range(start, stop, BATCH_SIZE):
+        numbers = range(batch_start, min(batch_start + BATCH_SIZE, stop))
+        with transaction.atomic():
+            recipes = _bulk(Recipe, [
+                Recipe(
+                    author_id=authors.sample(rng),
+                    name=f'Рецепт {number}',
+                    text=f'Описание рецепта {number}. ' * rng.randint(1, 20),
+                    image=params['image'],
+                    cooking_time=rng.randint(*COOKING_TIME_RANGE),
+                )
+                for number in numbers
+            ], ignore_conflicts=False)
+            # auto_now_add ставит текущее время, разносим даты по году
+            for recipe in recipes:
+                recipe.pub_date = now - PUB_DATE_SPREAD * rng.random()
+            Recipe.objects.bulk_update(
+                recipes, ['pub_date'], batch_size=BATCH_SIZE
+            )
+            _bulk(Recipe.tags.through, [
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in rng.sample(tag_ids, min(
+                    len(tag_ids), rng.randint(*TAGS_PER_RECIPE)
+                ))
+            ])
+            _bulk(RecipeIngredient, [
+                RecipeIngredient(
+                    recipe_id=recipe.pk, ingredient_id=ingredient_id,
+                    amount=rng.randint(*AMOUNT_RANGE)
+                )
+                for recipe in recipes
+                for ingredient_id in rng.sample(ingredient_ids, min(
+                    len(ingredient_ids), rng.randint(*INGREDIENTS_PER_RECIPE)
+                ))
+            ])
+            refresh_search_vectors(Recipe.objects.filter(
+                pk__in=[recipe.pk for recipe in recipes]
+            ))
+
+
+def seed_relation(name):
+    """
+    Связи пользователь — объект: пользователи равновероятны, объекты
+    (рецепты или авторы) распределены по Zipf. Каждое задание берёт свою
+    долю пользователей, поэтому повторы отсеиваются внутри задания и
+    строк выходит ровно столько, сколько просили, если хватает пар.
+    """
+    _, model, user_field, target_field = next(
+        relation for relation in RELATIONS if relation[0] == name
+    )
+    target_kind = 'users' if target_field == 'author' else 'recipes'
+
+    def seed(start, stop, rng, params):
+        users = _sampler('users', params).ids
+        users = users[
+            start * len(users) // params['total']:
+            stop * len(users) // params['total']
+        ]
+        if not users:
+            return
+        targets = _sampler(target_kind, params)
+        pairs = set()
+        attempts = (stop - start) * MAX_ATTEMPTS_PER_ROW
+        while len(pairs) < stop - start and attempts:
+            attempts -= 1
+            user_id = rng.choice(users)
+            target_id = targets.sample(rng)
+            if target_kind != 'users' or target_id != user_id:
+                pairs.add((user_id, target_id))
+        _bulk(model, [
+            model(**{
+                f'{user_field}_id': user_id,
+                f'{target_field}_id': target_id,
+            })
+            for user_id, target_id in pairs
+        ])
+
+    return seed
+
+
+def seed_feed(start, stop, rng, params):
+    """Ленты подписчиков, как после подписки через API."""
+    subscriptions = Subscription.objects.filter(
+        user__username__startswith=params['prefix'],
+        author__followers_count__lte=FEED_FANOUT_MAX_FOLLOWERS
+    ).order_by('pk').values_list('user_id', 'author_id')[start:stop]
+    for user_id, author_id in subscriptions:
+        backfill_feed(user_id, author_id)
+
+
+SEEDERS = {
+    'users': seed_users,
+    'recipes': seed_recipes,
+    'feed': seed_feed,
+    **{name: seed_relation(name) for name, *_ in RELATIONS},
+}
+
+
+def run_job(job):
+    """Выполняет задание (вид, начало, конец, параметры)."""
+    kind, start, stop, params = job
+    SEEDERS[kind](
+        start, stop, random.Random(f'{params["seed"]}:{kind}:{start}'),
+        params
+    )
+
+
+def run_pool_job(job):
+    """Задание в процессе-исполнителе: соединение не держим между ними."""
+    try:
+        run_job(job)
+    finally:
+        connections.close_all()
+
+
+def placeholder_image():
+    """Одна картинка на все рецепты: в хранилище по хешу она одна."""
+    buffer = BytesIO()
+    Image.new('RGB', (640, 480), (230, 200, 160)).save(buffer, 'JPEG')
+    return default_storage.save(
+        'recipes/seed.jpg', ContentFile(buffer.getvalue())
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт большой синтетический набор данных: пользователей, '
+        'рецепты, избранное, корзины и подписки с распределением '
+        'популярности по Zipf'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=100000)
+        parser.add_argument('--carts', type=int, default=10000)
+        parser.add_argument('--subscriptions', type=int, default=20000)
+        parser.add_argument(
+            '--feed', action='store_true',
+            help='Заполнить ленты подписок (медленно на больших объёмах)'
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения популярности'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов; для SQLite всегда один'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имён пользователей набора'
+        )
+        parser.add_argument(
+            '--password', default='seed-password',
+            help='Пароль всех созданных пользователей'
+        )
+
+    def handle(self, *args, **options):
+        if not Tag.objects.exists():
+            call_command('load_tags', stdout=self.stdout)
+        if not Ingredient.objects.exists():
+            call_command('load_ingrs', stdout=self.stdout)
+        params = {
+            'prefix': options['prefix'],
+            'exponent': options['zipf'],
+            'seed': options['seed'],
+            'password': make_password(options['password']),
+            'image': placeholder_image(),
+        }
+        workers = options['workers']
+        if connection.vendor == 'sqlite':
+            workers = 1
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup
+            )
+        _samplers.clear()
+        try:
+            self.run(pool, workers, 'users', options['users'], params, User)
+            if not User.objects.filter(
+                username__startswith=params['prefix']
+            ).exists():
+                raise CommandError('Нет пользователей набора: задайте --users')
+            self.run(
+                pool, workers, 'recipes', options['recipes'], params, Recipe
+            )
+            for name, model, *_ in RELATIONS:
+                self.run(pool, workers, name, options[name], params, model)
+            with transaction.atomic():
+                reconcile_counters()
+            if options['feed']:
+                self.run(
+                    pool, workers, 'feed',
+                    Subscription.objects.filter(
+                        user__username__startswith=params['prefix']
+                    ).count(),
+                    params, FeedEntry
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            _samplers.clear()
+        bump_catalog_version()
+        bump_tags_version()
+        bump_ingredients_version()
+        invalidate_tag_universe()
+        self.stdout.write(self.style.SUCCESS('Набор данных создан.'))
+
+    def run(self, pool, workers, kind, count, params, model):
+        if count <= 0:
+            return
+        started = timezone.now()
+        before = model.objects.count()
+        if kind == 'users':
+            offset = User.objects.filter(
+                username__startswith=params['prefix']
+            ).count()
+        else:
+            offset = 0
+        step = max(1, -(-count // (workers * JOBS_PER_WORKER)))
+        params = dict(params, total=offset + count)
+        jobs = [
+            (kind, start, min(start + step, offset + count), params)
+            for start in range(offset, offset + count, step)
+        ]
+        if pool is None:
+            for job in jobs:
+                run_job(job)
+        else:
+            list(pool.map(run_pool_job, jobs))
+        seconds = (timezone.now() - started).total_seconds()
+        self.stdout.write(
+            f'{kind}: создано {model.objects.count() - before} '
+            f'за {seconds:.1f} с'
+        )
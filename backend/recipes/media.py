@@ -0,0 +1,62 @@
+"""
+Учёт ссылок на блобы хранилища foodgram.storage.ContentAddressedStorage.
+
+Один файл может быть картинкой нескольких рецептов и аватаром, поэтому
+удалять его можно только когда ни одна строка на него не ссылается.
+Число ссылок считается запросами к полям из MEDIA_FIELDS.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+
+from recipes.models import Recipe
+from tasks.queue import enqueue, task
+
+User = get_user_model()
+
+# (модель, поле картинки); варианты лежат в поле <поле>_variants
+MEDIA_FIELDS = ((Recipe, 'image'), (User, 'avatar'))
+
+
+def reference_count(name):
+    return sum(
+        model.objects.filter(**{field_name: name}).count()
+        for model, field_name in MEDIA_FIELDS
+    )
+
+
+def find_variants(name):
+    """Готовые варианты того же файла у любой строки или None."""
+    for model, field_name in MEDIA_FIELDS:
+        variants = model.objects.filter(**{
+            field_name: name, f'{field_name}_variants__source': name
+        }).values_list(f'{field_name}_variants', flat=True).first()
+        if variants:
+            return variants
+    return None
+
+
+@task
+def release(name, variants=None):
+    """
+    Удаляет файл и его варианты, если на файл больше никто не ссылается.
+    Ставится в очередь при удалении или замене картинки.
+
+    Файл, записанный или загруженный повторно за последние
+    MEDIA_RELEASE_GRACE секунд, не удаляется: строка, которая на него
+    сошлётся, может быть ещё не закоммичена. Тогда release повторяется
+    позже (кроме TASKS_EAGER, где отложить нельзя).
+    """
+    if not name or reference_count(name):
+        return False
+    grace = settings.MEDIA_RELEASE_GRACE
+    if not default_storage.delete_if_stale(name, grace):
+        if default_storage.exists(name) and not settings.TASKS_EAGER:
+            enqueue(release, name, variants, delay=grace)
+        return False
+    if not variants or variants.get('source') != name:
+        return True
+    for variant in variants.get('variants', ()):
+        if not reference_count(variant['name']):
+            default_storage.delete_if_stale(variant['name'], grace)
+    return True
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.23 on 2026-10-18 03:24
+
+from django.db import migrations, models
+
+# Единица: (базовая единица, множитель)
+CONVERSIONS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мг': ('г', 0.001),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'ч. л.': ('мл', 5),
+    'ст. л.': ('мл', 15),
+    'стакан': ('мл', 250),
+    'капля': ('мл', 0.05),
+    'шт.': ('шт.', 1),
+}
+
+
+def fill_conversions(apps, schema_editor):
+    UnitConversion = apps.get_model('recipes', 'UnitConversion')
+    UnitConversion.objects.bulk_create(
+        [
+            UnitConversion(unit=unit, base_unit=base_unit, factor=factor)
+            for unit, (base_unit, factor) in CONVERSIONS.items()
+        ],
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_ingredient_name_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitConversion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.CharField(max_length=200, unique=True, verbose_name='Единица измерения')),
+                ('base_unit', models.CharField(max_length=200, verbose_name='Базовая единица')),
+                ('factor', models.FloatField(verbose_name='Множитель')),
+            ],
+            options={
+                'verbose_name': 'Перевод единиц',
+                'verbose_name_plural': 'Перевод единиц',
+                'ordering': ['base_unit', 'factor'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='density',
+            field=models.FloatField(blank=True, help_text='Для пересчёта объёма в граммы в списке покупок', null=True, verbose_name='Плотность, г/мл'),
+        ),
+        migrations.RunPython(fill_conversions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=200, unique=True, verbose_name='Источник')),
+                ('checksum', models.CharField(max_length=64, verbose_name='SHA-256 файлов')),
+                ('rows', models.PositiveIntegerField(verbose_name='Уникальных строк')),
+                ('imported_at', models.DateTimeField(auto_now=True, verbose_name='Загружено')),
+            ],
+            options={
+                'verbose_name': 'Загрузка данных',
+                'verbose_name_plural': 'Загрузки данных',
+            },
+        ),
+    ]
@@ -1,10 +1,15 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
 
 from api.constants import (
     MIN_AMOUNT, MAX_AMOUNT, MIN_COOKING_TIME, MAX_COOKING_TIME
 )
+from foodgram.models import CountersMixin
+from users.models import is_subscribed_annotation
 
 User = get_user_model()
 
@@ -33,6 +38,12 @@ class Ingredient(models.Model):
         'Единица измерения',
         max_length=200
     )
+    density = models.FloatField(
+        'Плотность, г/мл',
+        null=True,
+        blank=True,
+        help_text='Для пересчёта объёма в граммы в списке покупок'
+    )
 
     class Meta:
         ordering = ['name']
@@ -49,7 +60,101 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipe(models.Model):
+class UnitConversion(models.Model):
+    """Перевод единицы измерения в базовую: 1 unit = factor base_unit."""
+    unit = models.CharField('Единица измерения', max_length=200, unique=True)
+    base_unit = models.CharField('Базовая единица', max_length=200)
+    factor = models.FloatField('Множитель')
+
+    class Meta:
+        verbose_name = 'Перевод единиц'
+        verbose_name_plural = 'Перевод единиц'
+        ordering = ['base_unit', 'factor']
+
+    def __str__(self):
+        return f'1 {self.unit} = {self.factor} {self.base_unit}'
+
+
+class DataImport(models.Model):
+    """Последняя загрузка справочника: контрольная сумма исходных файлов."""
+    source = models.CharField('Источник', max_length=200, unique=True)
+    checksum = models.CharField('SHA-256 файлов', max_length=64)
+    rows = models.PositiveIntegerField('Уникальных строк')
+    imported_at = models.DateTimeField('Загружено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Загрузка данных'
+        verbose_name_plural = 'Загрузки данных'
+
+    def __str__(self):
+        return f'{self.source}: {self.checksum[:12]}'
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов с данными для сериализатора чтения."""
+
+    def with_user_flags(self, user):
+        """Аннотирует is_favorited и is_in_shopping_cart для user."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False)
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )
+            )
+        )
+
+    def with_related(self, user):
+        """
+        Флаги пользователя плюс предзагрузка автора, тегов и ингредиентов:
+        число запросов не зависит от количества рецептов. Поисковый
+        вектор в выдачу не попадает и не загружается.
+        """
+        return self.with_user_flags(user).defer(
+            'search_vector'
+        ).prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=is_subscribed_annotation(user)
+                )
+            ),
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('pk')
+            )
+        )
+
+    def latest_by_author(self, author_ids, limit):
+        """
+        Не более limit последних рецептов каждого автора одним запросом
+        (ROW_NUMBER() OVER (PARTITION BY author_id ORDER BY pub_date DESC)).
+        """
+        recipes = {author_id: [] for author_id in author_ids}
+        if not recipes or limit <= 0:
+            return recipes
+        for recipe in self.filter(author_id__in=author_ids).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('pk').desc())
+            )
+        ).filter(row_number__lte=limit).order_by('-pub_date', '-pk'):
+            recipes[recipe.author_id].append(recipe)
+        return recipes
+
+
+class Recipe(CountersMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -58,6 +163,12 @@ class Recipe(models.Model):
     )
     name = models.CharField('Название', max_length=200)
     image = models.ImageField('Картинка', upload_to='recipes/')
+    image_variants = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     text = models.TextField('Описание')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -76,6 +187,24 @@ class Recipe(models.Model):
         ]
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'Добавлено в избранное',
+        default=0,
+        db_index=True
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        'Добавлено в корзину',
+        default=0
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    COUNTER_FIELDS = ('favorites_count', 'shopping_carts_count')
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -178,3 +307,39 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} -> {self.recipe}'
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок: рецепт автора в ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_entry_user_pub_date'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} <- {self.recipe}'
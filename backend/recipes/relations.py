@@ -0,0 +1,154 @@
+"""
+Избранное, список покупок и подписки одним SQL-запросом.
+
+Одиночные переключатели (link/unlink) пишут через
+INSERT ... ON CONFLICT DO NOTHING RETURNING и DELETE ... RETURNING
+и сами отправляют post_save/post_delete, чтобы сработали счётчики,
+версия корзины и лента. Пакетные add_recipes/remove_recipes пишут так
+же, но многострочно, сигналы не отправляют и обновляют счётчики одним
+запросом на всю пачку — только для строк, которые вернул RETURNING.
+"""
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+
+from api.cache import bump_cart_version
+from recipes.counters import adjust_related_counters
+from recipes.models import Recipe, ShoppingCart
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+NOT_FOUND = 'not_found'
+
+
+def _column(model, name):
+    return connection.ops.quote_name(model._meta.get_field(name).column)
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _insert_returning(model, values):
+    """Первичный ключ новой строки или None, если такая уже есть."""
+    columns = ', '.join(_column(model, name) for name in values)
+    placeholders = ', '.join(['%s'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {_table(model)} ({columns}) '
+            f'VALUES ({placeholders}) ON CONFLICT DO NOTHING '
+            f'RETURNING {_column(model, model._meta.pk.name)}',
+            list(values.values())
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _insert_many_returning(model, user_id, name, values, returning):
+    """
+    INSERT строк пользователя со значениями поля name из values
+    с ON CONFLICT DO NOTHING; возвращает значения поля returning
+    только у вставленных строк.
+    """
+    placeholders = ', '.join(['(%s, %s)'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {_table(model)} '
+            f'({_column(model, "user")}, {_column(model, name)}) '
+            f'VALUES {placeholders} ON CONFLICT DO NOTHING '
+            f'RETURNING {_column(model, returning)}',
+            [param for value in values for param in (user_id, value)]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _delete_returning(model, user_id, name, values, returning):
+    """
+    DELETE строк пользователя, у которых поле name входит в values;
+    возвращает значения поля returning удалённых строк.
+    """
+    placeholders = ', '.join(['%s'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {_table(model)} '
+            f'WHERE {_column(model, "user")} = %s '
+            f'AND {_column(model, name)} IN ({placeholders}) '
+            f'RETURNING {_column(model, returning)}',
+            [user_id, *values]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def link(model, user, **targets):
+    """
+    Создаёт связь пользователя с объектом (рецептом или автором).
+    Возвращает новую запись или None, если связь уже была.
+    """
+    values = {'user': user.pk}
+    values.update({name: obj.pk for name, obj in targets.items()})
+    pk = _insert_returning(model, values)
+    if pk is None:
+        return None
+    instance = model(pk=pk, user=user, **targets)
+    post_save.send(
+        sender=model, instance=instance, created=True,
+        update_fields=None, raw=False, using=connection.alias
+    )
+    return instance
+
+
+def unlink(model, user, **targets):
+    """Удаляет связь; возвращает False, если её не было."""
+    (name, obj), = targets.items()
+    deleted = _delete_returning(
+        model, user.pk, name, [obj.pk], model._meta.pk.name
+    )
+    if not deleted:
+        return False
+    instance = model(pk=deleted[0], user=user, **targets)
+    post_delete.send(
+        sender=model, instance=instance, origin=instance,
+        using=connection.alias
+    )
+    return True
+
+
+def _changed(model, user_id, recipe_ids, delta):
+    if not recipe_ids:
+        return
+    adjust_related_counters(
+        model,
+        [model(user_id=user_id, recipe_id=pk) for pk in recipe_ids],
+        delta
+    )
+    if model is ShoppingCart:
+        transaction.on_commit(lambda: bump_cart_version(user_id))
+
+
+@transaction.atomic
+def add_recipes(model, user, recipe_ids):
+    """Добавляет рецепты в избранное или корзину: {recipe_id: статус}."""
+    found = list(
+        Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', flat=True)
+    )
+    added = set()
+    if found:
+        added = set(
+            _insert_many_returning(model, user.pk, 'recipe', found, 'recipe')
+        )
+    _changed(model, user.pk, added, 1)
+    outcome = dict.fromkeys(recipe_ids, NOT_FOUND)
+    outcome.update({pk: ADDED if pk in added else EXISTS for pk in found})
+    return outcome
+
+
+@transaction.atomic
+def remove_recipes(model, user, recipe_ids):
+    """Убирает рецепты из избранного или корзины: {recipe_id: статус}."""
+    removed = set(
+        _delete_returning(model, user.pk, 'recipe', recipe_ids, 'recipe')
+    )
+    _changed(model, user.pk, removed, -1)
+    return {
+        pk: REMOVED if pk in removed else NOT_FOUND for pk in recipe_ids
+    }
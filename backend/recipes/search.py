@@ -0,0 +1,108 @@
+"""
+Полнотекстовый поиск рецептов.
+
+В PostgreSQL у рецепта хранится search_vector: название (вес A),
+описание (B) и названия ингредиентов (C) в конфигурациях russian
+(словоформы) и simple (слова как есть). По нему строится GIN-индекс,
+найденное сортируется по ts_rank. Опечатки ловит сходство триграмм
+с названием. На других базах — поиск подстроки без индекса.
+"""
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+)
+from django.db import connection
+from django.db.models import (
+    Case, Exists, F, IntegerField, OuterRef, Q, Subquery, Value, When
+)
+
+from recipes.models import Recipe, RecipeIngredient
+from tasks.queue import task
+
+CONFIGS = ('russian', 'simple')
+SEARCH_ORDERING = ('-pub_date', '-id')
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector(model):
+    """Выражение для search_vector рецептов модели model."""
+    through = model._meta.get_field('recipeingredient_set').related_model
+    ingredient_names = Subquery(
+        through.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+    )
+    vector = None
+    for config in CONFIGS:
+        for expression, weight in (
+            ('name', 'A'), ('text', 'B'), (ingredient_names, 'C')
+        ):
+            part = SearchVector(expression, config=config, weight=weight)
+            vector = part if vector is None else vector + part
+    return vector
+
+
+def refresh_search_vectors(queryset):
+    """Пересчитывает search_vector рецептов queryset одним UPDATE."""
+    if not is_supported():
+        return 0
+    return queryset.model.objects.filter(
+        pk__in=queryset.values('pk')
+    ).update(search_vector=search_vector(queryset.model))
+
+
+@task
+def refresh_ingredient_recipes(ingredient_id):
+    """Задача очереди: рецепты с переименованным ингредиентом."""
+    refresh_search_vectors(Recipe.objects.filter(
+        recipeingredient_set__ingredient_id=ingredient_id
+    ))
+
+
+def search_recipes(queryset, value):
+    """
+    Рецепты, подходящие под запрос value, от лучших к худшим.
+    Совпадения полнотекстового поиска идут первыми по ts_rank, за ними —
+    похожие названия (опечатки) по сходству триграмм.
+    """
+    value = value.strip()
+    if not value:
+        return queryset
+    if not is_supported():
+        return _search_substring(queryset, value)
+    query = None
+    for config in CONFIGS:
+        part = SearchQuery(value, config=config, search_type='websearch')
+        query = part if query is None else query | part
+    return queryset.filter(
+        Q(search_vector=query) | Q(name__trigram_similar=value)
+    ).annotate(
+        search_rank=SearchRank(F('search_vector'), query),
+        search_similarity=TrigramSimilarity('name', value),
+    ).order_by('-search_rank', '-search_similarity', *SEARCH_ORDERING)
+
+
+def _search_substring(queryset, value):
+    """
+    Поиск подстроки для баз без tsvector (SQLite в тестах). SQLite
+    не различает регистр только у латиницы.
+    """
+    return queryset.filter(
+        Q(name__icontains=value)
+        | Q(text__icontains=value)
+        | Exists(RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__name__icontains=value
+        ))
+    ).annotate(
+        search_rank=Case(
+            When(name__icontains=value, then=Value(2)),
+            When(text__icontains=value, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    ).order_by('-search_rank', *SEARCH_ORDERING)
@@ -1,10 +1,36 @@
+import base64
+import hashlib
+import json
+import os
+from io import BytesIO, StringIO
+
 import pytest
+from PIL import Image
 
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
-from users.models import User
+from api.cache import (
+    get_cart_version, get_catalog_version, get_tag_universe
+)
+from api.metrics import collect, registry
+from api.shopping_list import shopping_list_items
+from foodgram.storage import is_content_addressed
+from recipes import feed
+from recipes.counters import reconcile_counters
+from recipes.media import release
+from recipes.models import (
+    FeedEntry, Ingredient, Recipe, RecipeIngredient, Tag
+)
+from tasks.models import Task
+from users.models import Subscription, User
 
 
 @pytest.mark.django_db
@@ -83,3 +109,799 @@ def test_recipe_list_api():
     client = APIClient()
     response = client.get("/api/recipes/")
     assert response.status_code == status.HTTP_200_OK
+
+
+def _create_recipes(count):
+    tag = Tag.objects.create(name="Ужин", color="#8775D2", slug="dinner")
+    ingr = Ingredient.objects.create(name="Рис", measurement_unit="г")
+    for i in range(count):
+        author = User.objects.create_user(
+            username=f"author{i}",
+            email=f"author{i}@example.com",
+            password="testpass"
+        )
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f"Рецепт {i}",
+            image="recipes/test.jpg",
+            text="Описание",
+            cooking_time=10
+        )
+        recipe.tags.add(tag)
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingr, amount=100
+        )
+
+
+@pytest.mark.django_db
+def test_recipe_list_query_count_does_not_depend_on_page_size():
+    _create_recipes(10)
+    user = User.objects.create_user(
+        username="reader", email="reader@example.com", password="testpass"
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+
+    counts = []
+    for limit in (2, 10):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(f"/api/recipes/?limit={limit}")
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == limit
+        counts.append(len(ctx.captured_queries))
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db
+def test_recipe_list_tag_filter_does_not_scan_recipes():
+    _create_recipes(3)
+    lunch = Tag.objects.create(name="Обед", color="#49B64E", slug="lunch")
+    Recipe.objects.first().tags.add(lunch)
+    get_tag_universe()
+    client = APIClient()
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get("/api/recipes/?tags=lunch")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["count"] == 1
+    assert not any(
+        "DISTINCT" in query["sql"] and "recipes_tag" in query["sql"]
+        and "slug" in query["sql"].split("FROM")[0]
+        for query in ctx.captured_queries
+    )
+    # Проверка слагов по таблице тегов, count, страница и три prefetch
+    assert len(ctx.captured_queries) == 6
+
+    response = client.get("/api/recipes/?tags=unknown")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_tag_universe_follows_recipe_tags(
+    django_capture_on_commit_callbacks
+):
+    _create_recipes(2)
+    lunch = Tag.objects.create(name="Обед", color="#49B64E", slug="lunch")
+    assert get_tag_universe() == {"dinner": 2}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Recipe.objects.first().tags.add(lunch)
+        # До коммита в кэше остаётся прежний набор
+        assert get_tag_universe() == {"dinner": 2}
+    assert get_tag_universe() == {"dinner": 2, "lunch": 1}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Recipe.objects.first().delete()
+    assert get_tag_universe() == {"dinner": 1}
+
+
+@pytest.mark.django_db
+def test_recipe_list_cursor_pagination():
+    _create_recipes(5)
+    client = APIClient()
+
+    response = client.get("/api/recipes/?pagination=cursor&limit=3")
+    assert response.status_code == status.HTTP_200_OK
+    assert "count" not in response.data
+    assert response.data["previous"] is None
+    ids = [recipe["id"] for recipe in response.data["results"]]
+
+    response = client.get(response.data["next"])
+    assert response.data["next"] is None
+    ids += [recipe["id"] for recipe in response.data["results"]]
+    assert ids == list(
+        Recipe.objects.order_by("-pub_date", "-id").values_list(
+            "id", flat=True
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_anonymous_recipe_list_is_cached_until_catalog_changes(
+    django_capture_on_commit_callbacks
+):
+    registry.reset()
+    _create_recipes(1)
+    client = APIClient()
+
+    assert client.get("/api/recipes/")["X-Cache"] == "MISS"
+    assert client.get("/api/recipes/")["X-Cache"] == "HIT"
+
+    recipe = Recipe.objects.get()
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.name = "Новое название"
+        recipe.save()
+
+    response = client.get("/api/recipes/")
+    assert response["X-Cache"] == "MISS"
+    assert response.data["results"][0]["name"] == "Новое название"
+    assert collect()["counters"]["response_cache_total"] == {
+        "hit": 1, "miss": 2
+    }
+
+
+@pytest.mark.django_db
+def test_only_visible_author_changes_bump_catalog(
+    django_capture_on_commit_callbacks
+):
+    _create_recipes(1)
+    author = User.objects.get()
+    reader = User.objects.create_user(
+        username="reader", email="reader@example.com", password="testpass"
+    )
+
+    def bumped(user, **changes):
+        version = get_catalog_version()
+        with django_capture_on_commit_callbacks(execute=True):
+            for name, value in changes.items():
+                setattr(user, name, value)
+            user.save()
+        return get_catalog_version() != version
+
+    assert not bumped(reader, first_name="Читатель")
+    assert not bumped(author, last_login=timezone.now())
+    assert not bumped(author, first_name=author.first_name)
+    assert bumped(author, first_name="Автор")
+
+
+@pytest.mark.django_db
+def test_counters_follow_writes_and_reconcile():
+    _create_recipes(1)
+    recipe = Recipe.objects.get()
+    user = User.objects.create_user(
+        username="fan", email="fan@example.com", password="testpass"
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+
+    client.post(f"/api/recipes/{recipe.id}/favorite/")
+    client.post(f"/api/recipes/{recipe.id}/shopping_cart/")
+    client.post(f"/api/users/{recipe.author_id}/subscribe/")
+    recipe.refresh_from_db()
+    recipe.author.refresh_from_db()
+    user.refresh_from_db()
+    assert recipe.favorites_count == 1
+    assert recipe.shopping_carts_count == 1
+    assert recipe.author.recipes_count == 1
+    assert recipe.author.followers_count == 1
+    assert user.following_count == 1
+
+    client.delete(f"/api/recipes/{recipe.id}/favorite/")
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 0
+
+    Recipe.objects.update(favorites_count=7)
+    assert reconcile_counters()["recipe.favorites_count"] == 1
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 0
+
+
+@pytest.mark.django_db
+def test_save_does_not_overwrite_counters():
+    _create_recipes(1)
+    stale = Recipe.objects.get()
+    author = User.objects.get(pk=stale.author_id)
+    Recipe.objects.update(favorites_count=F("favorites_count") + 3)
+    User.objects.update(followers_count=F("followers_count") + 2)
+
+    stale.name = "Новое название"
+    stale.save()
+    author.first_name = "Новое имя"
+    author.save()
+    stale.refresh_from_db()
+    author.refresh_from_db()
+    assert (stale.name, stale.favorites_count) == ("Новое название", 3)
+    assert (author.first_name, author.followers_count) == ("Новое имя", 2)
+
+
+@pytest.mark.django_db
+def test_ingredient_autocomplete_prefix_first(
+    settings, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        for name in ("Сахарная пудра", "Ванильный сахар", "сахар", "Соль"):
+            Ingredient.objects.create(name=name, measurement_unit="г")
+    client = APIClient()
+
+    expected = ["сахар", "Сахарная пудра", "Ванильный сахар"]
+    # LIKE в SQLite не учитывает регистр только для ASCII.
+    modes = (True, False) if connection.vendor == "postgresql" else (True,)
+    for use_index in modes:
+        settings.INGREDIENT_SEARCH_INDEX = use_index
+        response = client.get("/api/ingredients/?name=САХ")
+        assert [row["name"] for row in response.data] == expected
+
+    settings.INGREDIENT_SEARCH_INDEX = True
+    with django_capture_on_commit_callbacks(execute=True):
+        Ingredient.objects.create(name="Сахарин", measurement_unit="г")
+    response = client.get("/api/ingredients/?name=сахари")
+    assert [row["name"] for row in response.data] == ["Сахарин"]
+
+
+@pytest.mark.django_db
+def test_reference_data_conditional_get(django_capture_on_commit_callbacks):
+    Tag.objects.create(name="Обед", color="#49B64E", slug="lunch")
+    client = APIClient()
+
+    response = client.get("/api/tags/")
+    etag = response["ETag"]
+    assert "max-age" in response["Cache-Control"]
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert len(ctx.captured_queries) == 1
+
+    response = client.get("/api/ingredients/?name=a", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Tag.objects.filter(slug="lunch").get().save()
+    response = client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_fast_read_path_matches_read_serializer(settings):
+    _create_recipes(3)
+    breakfast = Tag.objects.create(
+        name="Завтрак", color="#E26C2D", slug="breakfast"
+    )
+    salt = Ingredient.objects.create(name="Соль", measurement_unit="г")
+    user = User.objects.create_user(
+        username="reader", email="reader@example.com", password="testpass"
+    )
+    for recipe in Recipe.objects.all()[:2]:
+        recipe.tags.add(breakfast)
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=salt, amount=5
+        )
+        recipe.in_favorites.create(user=user)
+    author = Recipe.objects.first().author
+    author.avatar = "avatars/test.jpg"
+    author.save()
+    user.follower.create(author=author)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    for url in ("/api/recipes/", "/api/recipes/favorites/"):
+        settings.RECIPE_READ_FAST_PATH = False
+        expected = client.get(url).json()
+        settings.RECIPE_READ_FAST_PATH = True
+        assert client.get(url).json() == expected
+
+
+@pytest.mark.django_db
+def test_download_shopping_cart_formats_and_cache(
+    django_capture_on_commit_callbacks
+):
+    _create_recipes(2)
+    user = User.objects.create_user(
+        username="buyer", email="buyer@example.com", password="testpass"
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+    with django_capture_on_commit_callbacks(execute=True):
+        for recipe in Recipe.objects.all():
+            client.post(f"/api/recipes/{recipe.id}/shopping_cart/")
+    url = "/api/recipes/download_shopping_cart/"
+
+    response = client.get(url)
+    assert response["Content-Type"].startswith("text/plain")
+    assert b"".join(response.streaming_content) == "Рис - 200 г\n".encode()
+
+    response = client.get(url, {"format": "csv"})
+    assert b"".join(response.streaming_content).decode(
+        "utf-8-sig"
+    ).splitlines()[1] == "Рис,200,г"
+
+    response = client.get(url, {"format": "json"})
+    assert json.loads(b"".join(response.streaming_content)) == [
+        {"name": "Рис", "amount": 200, "measurement_unit": "г"}
+    ]
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(url, {"format": "json"})
+        b"".join(response.streaming_content)
+    assert len(ctx.captured_queries) == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.delete(
+            f"/api/recipes/{Recipe.objects.first().id}/shopping_cart/"
+        )
+    response = client.get(url)
+    assert b"".join(response.streaming_content) == "Рис - 100 г\n".encode()
+
+
+@pytest.mark.django_db
+def test_download_shopping_cart_pdf(settings):
+    pytest.importorskip("reportlab")
+    if not os.path.exists(settings.SHOPPING_LIST_PDF_FONT):
+        pytest.skip(f"Нет шрифта {settings.SHOPPING_LIST_PDF_FONT}")
+    _create_recipes(1)
+    user = User.objects.create_user(
+        username="buyer", email="buyer@example.com", password="testpass"
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+    client.post(f"/api/recipes/{Recipe.objects.get().id}/shopping_cart/")
+    url = "/api/recipes/download_shopping_cart/"
+
+    response = client.get(url, {"format": "pdf"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == "application/pdf"
+    assert b"".join(response.streaming_content).startswith(b"%PDF-")
+
+    settings.SHOPPING_LIST_PDF_FONT = "/nonexistent.ttf"
+    response = client.get(url, {"format": "pdf"})
+    assert response.status_code == status.HTTP_406_NOT_ACCEPTABLE
+    assert response["Content-Type"] == "application/json"
+    assert "PDF" in response.json()["detail"]
+
+
+@pytest.mark.django_db
+def test_shopping_list_normalizes_units():
+    user = User.objects.create_user(
+        username="cook", email="cook@example.com", password="testpass"
+    )
+    sugar = [
+        Ingredient.objects.create(
+            name="сахар", measurement_unit=unit, density=0.8
+        )
+        for unit in ("г", "кг", "ст. л.")
+    ]
+    milk = [
+        Ingredient.objects.create(name="молоко", measurement_unit=unit)
+        for unit in ("мл", "стакан")
+    ]
+    for ingredient, amount in zip(sugar + milk, (200, 1, 1, 900, 2)):
+        recipe = Recipe.objects.create(
+            author=user, name="Рецепт", image="recipes/test.jpg",
+            text="Описание", cooking_time=5
+        )
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=amount
+        )
+        recipe.in_shopping_carts.create(user=user)
+
+    assert list(shopping_list_items(user)) == [
+        {"name": "молоко", "amount": 1.4, "measurement_unit": "л"},
+        {"name": "сахар", "amount": 1.21, "measurement_unit": "кг"},
+    ]
+
+
+@pytest.mark.django_db
+def test_feed_merges_timeline_and_popular_authors(
+    django_capture_on_commit_callbacks, monkeypatch
+):
+    _create_recipes(3)
+    author0, author1, _ = User.objects.filter(
+        username__startswith="author"
+    ).order_by("username")
+    reader = User.objects.create_user(
+        username="reader", email="reader@example.com", password="testpass"
+    )
+    client = APIClient()
+    client.force_authenticate(reader)
+
+    Subscription.objects.create(user=reader, author=author0)
+    Subscription.objects.create(user=reader, author=author1)
+    assert FeedEntry.objects.filter(user=reader).count() == 2
+
+    with django_capture_on_commit_callbacks(execute=True):
+        fresh = Recipe.objects.create(
+            author=author0, name="Новый", image="recipes/test.jpg",
+            text="Описание", cooking_time=5
+        )
+    assert FeedEntry.objects.filter(user=reader, recipe=fresh).exists()
+
+    monkeypatch.setattr(feed, "FEED_FANOUT_MAX_FOLLOWERS", 0)
+    monkeypatch.setattr(feed, "READ_FANOUT_MIN_FOLLOWERS", 0)
+    with django_capture_on_commit_callbacks(execute=True):
+        popular = Recipe.objects.create(
+            author=author1, name="Популярный", image="recipes/test.jpg",
+            text="Описание", cooking_time=5
+        )
+    assert not FeedEntry.objects.filter(recipe=popular).exists()
+
+    response = client.get("/api/recipes/feed/?limit=2")
+    assert response.status_code == status.HTTP_200_OK
+    assert "count" not in response.data
+    ids = [recipe["id"] for recipe in response.data["results"]]
+    response = client.get(response.data["next"])
+    ids += [recipe["id"] for recipe in response.data["results"]]
+    assert ids == list(
+        Recipe.objects.filter(author__in=[author0, author1])
+        .order_by("-pub_date", "-id").values_list("id", flat=True)
+    )
+
+    Subscription.objects.filter(user=reader, author=author0).delete()
+    assert list(
+        FeedEntry.objects.filter(user=reader).values_list(
+            "recipe__author", flat=True
+        )
+    ) == [author1.pk]
+
+
+@pytest.mark.django_db
+def test_bulk_cart_endpoint(django_capture_on_commit_callbacks):
+    _create_recipes(3)
+    first, second, third = Recipe.objects.order_by("id")
+    user = User.objects.create_user(
+        username="planner", email="planner@example.com", password="testpass"
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+    client.post(f"/api/recipes/{first.pk}/shopping_cart/")
+    version = get_cart_version(user.pk)
+
+    ids = [first.pk, second.pk, third.pk, second.pk, 999999]
+    with CaptureQueriesContext(connection) as ctx:
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                "/api/recipes/shopping_cart/", {"recipes": ids},
+                format="json"
+            )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["results"] == [
+        {"id": first.pk, "status": "exists"},
+        {"id": second.pk, "status": "added"},
+        {"id": third.pk, "status": "added"},
+        {"id": 999999, "status": "not_found"},
+    ]
+    assert len(ctx.captured_queries) <= 6
+    assert user.shopping_cart.count() == 3
+    assert get_cart_version(user.pk) != version
+    assert list(
+        Recipe.objects.order_by("id").values_list(
+            "shopping_carts_count", flat=True
+        )
+    ) == [1, 1, 1]
+
+    response = client.delete(
+        "/api/recipes/shopping_cart/",
+        {"recipes": [first.pk, third.pk, 999999]}, format="json"
+    )
+    assert [item["status"] for item in response.data["results"]] == [
+        "removed", "removed", "not_found"
+    ]
+    assert list(
+        user.shopping_cart.values_list("recipe", flat=True)
+    ) == [second.pk]
+    third.refresh_from_db()
+    assert third.shopping_carts_count == 0
+
+    response = client.post(
+        "/api/recipes/favorite/", {"recipes": []}, format="json"
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_favorite_toggle_single_statement():
+    _create_recipes(1)
+    recipe = Recipe.objects.get()
+    user = User.objects.create_user(
+        username="fan", email="fan@example.com", password="testpass"
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+    url = f"/api/recipes/{recipe.pk}/favorite/"
+
+    response = client.post(url)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert set(response.data) == {
+        "id", "name", "image", "image_set", "cooking_time"
+    }
+    assert client.post(url).status_code == status.HTTP_400_BAD_REQUEST
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 1
+
+    assert client.delete(url).status_code == status.HTTP_200_OK
+    assert client.delete(url).status_code == status.HTTP_404_NOT_FOUND
+    assert client.post("/api/recipes/999999/favorite/").status_code == (
+        status.HTTP_404_NOT_FOUND
+    )
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 0
+
+
+@pytest.mark.django_db
+def test_image_variants_are_built_after_commit(
+    django_capture_on_commit_callbacks
+):
+    _create_recipes(1)
+    recipe = Recipe.objects.get()
+    buffer = BytesIO()
+    Image.new("RGB", (800, 400), "orange").save(buffer, "JPEG")
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.image.save("photo.jpg", ContentFile(buffer.getvalue()))
+
+    recipe.refresh_from_db()
+    assert recipe.image_variants["source"] == recipe.image.name
+    assert sorted(
+        (variant["width"], variant["format"])
+        for variant in recipe.image_variants["variants"]
+    ) == [
+        (320, "jpeg"), (320, "webp"), (640, "jpeg"), (640, "webp"),
+        (800, "jpeg"), (800, "webp"),
+    ]
+    image_set = APIClient().get(
+        f"/api/recipes/{recipe.pk}/"
+    ).data["image_set"]
+    assert image_set["srcset"].endswith(".jpg 800w")
+    assert image_set["webp"].count("webp") == 3
+
+
+@pytest.mark.django_db
+def test_media_is_deduplicated_and_released(
+    django_capture_on_commit_callbacks
+):
+    _create_recipes(2)
+    first, second = Recipe.objects.order_by("id")
+    buffer = BytesIO()
+    Image.new("RGB", (100, 100), "green").save(buffer, "PNG")
+    with django_capture_on_commit_callbacks(execute=True):
+        for recipe in (first, second):
+            recipe.image.save("upload.png", ContentFile(buffer.getvalue()))
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert first.image.name == second.image.name
+    assert is_content_addressed(first.image.name)
+    assert first.image_variants == second.image_variants
+    storage = first.image.storage
+    variant = first.image_variants["variants"][0]["name"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        first.delete()
+    assert storage.exists(second.image.name)
+    assert storage.exists(variant)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    assert not storage.exists(second.image.name)
+    assert not storage.exists(variant)
+
+
+@pytest.mark.django_db
+def test_release_keeps_recently_uploaded_blob(
+    settings, django_capture_on_commit_callbacks
+):
+    settings.MEDIA_RELEASE_GRACE = 60
+    settings.TASKS_EAGER = False
+    name = default_storage.save("recipes/a.png", ContentFile(b"data"))
+    os.utime(default_storage.path(name), (0, 0))
+    assert default_storage.save("recipes/b.png", ContentFile(b"data")) == name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert not release(name)
+    assert default_storage.exists(name)
+    assert Task.objects.get().run_after > timezone.now()
+
+    os.utime(default_storage.path(name), (0, 0))
+    assert release(name)
+    assert not default_storage.exists(name)
+
+
+@pytest.mark.django_db
+def test_avatar_delete_keeps_shared_blob(django_capture_on_commit_callbacks):
+    _create_recipes(1)
+    recipe = Recipe.objects.get()
+    buffer = BytesIO()
+    Image.new("RGB", (50, 50), "blue").save(buffer, "PNG")
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.image.save("photo.png", ContentFile(buffer.getvalue()))
+    user = User.objects.get(pk=recipe.author_id)
+    client = APIClient()
+    client.force_authenticate(user)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.put(
+            "/api/users/me/avatar/",
+            {"avatar": f"data:image/png;base64,{encoded}"}, format="json"
+        )
+    assert response.status_code == status.HTTP_200_OK
+    user.refresh_from_db()
+    recipe.refresh_from_db()
+    assert user.avatar.name == recipe.image.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.delete("/api/users/me/avatar/")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    user.refresh_from_db()
+    assert not user.avatar
+    assert recipe.image.storage.exists(recipe.image.name)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.delete()
+    assert not recipe.image.storage.exists(recipe.image.name)
+
+
+@pytest.mark.django_db
+def test_load_ingrs_bulk_dedup_and_checksum(tmp_path):
+    (tmp_path / "ingredients.json").write_text(json.dumps([
+        {"name": "мука", "measurement_unit": "г"},
+        {"name": "молоко", "measurement_unit": "мл"},
+        {"name": "мука", "measurement_unit": "г"},
+    ]), encoding="utf-8")
+    (tmp_path / "ingredients.csv").write_text(
+        "молоко,мл\nсоль,г\n,г\n", encoding="utf-8"
+    )
+
+    def load():
+        out = StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("load_ingrs", data_dir=str(tmp_path), stdout=out)
+        return out.getvalue(), len(ctx.captured_queries)
+
+    output, _ = load()
+    assert "создано новых ингредиентов: 3" in output
+    assert sorted(
+        Ingredient.objects.values_list("name", flat=True)
+    ) == ["молоко", "мука", "соль"]
+    assert Ingredient.objects.get(name="соль").density == 1.2
+
+    output, queries = load()
+    assert "уже загружены" in output
+    assert queries == 2
+
+    with open(tmp_path / "ingredients.csv", "a", encoding="utf-8") as file:
+        file.write("сахар,г\n")
+    output, _ = load()
+    assert "создано новых ингредиентов: 1" in output
+
+
+@pytest.mark.django_db
+def test_export_import_recipes_round_trip(tmp_path):
+    _create_recipes(3)
+    Recipe.objects.filter(name="Рецепт 0").update(
+        pub_date="2020-01-02T03:04:05Z"
+    )
+    media = tmp_path / "source"
+    (media / "recipes").mkdir(parents=True)
+    (media / "recipes" / "test.jpg").write_bytes(b"image")
+    dump = tmp_path / "recipes.jsonl"
+    call_command("export_recipes", str(dump), stderr=StringIO())
+    lines = [
+        json.loads(line)
+        for line in dump.read_text(encoding="utf-8").splitlines()
+    ]
+    assert len(lines) == 3
+    old_ids = {line["id"] for line in lines}
+    lost = next(line for line in lines if line["name"] == "Рецепт 1")
+    lost["image"] = "recipes/lost.jpg"
+    dump.write_text(
+        "\n".join(json.dumps(line) for line in lines), encoding="utf-8"
+    )
+
+    Recipe.objects.all().delete()
+    User.objects.all().delete()
+    Tag.objects.all().delete()
+    id_map = tmp_path / "ids.csv"
+    out, err = StringIO(), StringIO()
+    call_command(
+        "import_recipes", str(dump), batch_size=2, media_from=str(media),
+        id_map=str(id_map), stdout=out, stderr=err
+    )
+    assert "Создано рецептов: 3" in out.getvalue()
+    assert f"Рецепт {lost['id']}: нет картинки recipes/lost.jpg" in (
+        err.getvalue()
+    )
+    assert not Recipe.objects.get(name="Рецепт 1").image
+    assert "новых авторов: 3, тегов: 1, ингредиентов: 0" in out.getvalue()
+    recipe = Recipe.objects.get(name="Рецепт 0")
+    assert recipe.pub_date.year == 2020
+    assert is_content_addressed(recipe.image.name)
+    assert list(recipe.tags.values_list("slug", flat=True)) == ["dinner"]
+    assert list(recipe.recipeingredient_set.values_list(
+        "ingredient__name", "amount"
+    )) == [("Рис", 100)]
+    assert recipe.author.recipes_count == 1
+    assert not recipe.author.has_usable_password()
+    rows = id_map.read_text(encoding="utf-8").splitlines()[1:]
+    assert {int(row.split(",")[0]) for row in rows} == old_ids
+
+    out = StringIO()
+    call_command("import_recipes", str(dump), stdout=out)
+    assert "Создано рецептов: 0, пропущено существующих: 3" in out.getvalue()
+    assert Recipe.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_import_recipes_releases_images_of_failed_batch(tmp_path):
+    media = tmp_path / "source"
+    (media / "recipes").mkdir(parents=True)
+    (media / "recipes" / "broken.jpg").write_bytes(b"broken")
+    dump = tmp_path / "recipes.jsonl"
+    dump.write_text(json.dumps({
+        "id": 1, "name": "Без времени", "text": "Описание",
+        "cooking_time": None, "image": "recipes/broken.jpg",
+        "pub_date": "2020-01-02T03:04:05Z", "tags": [], "ingredients": [],
+        "author": {
+            "username": "chef", "email": "chef@example.com",
+            "first_name": "Шеф", "last_name": "Повар",
+        },
+    }), encoding="utf-8")
+
+    with pytest.raises(IntegrityError):
+        call_command(
+            "import_recipes", str(dump), media_from=str(media),
+            stdout=StringIO(), stderr=StringIO()
+        )
+    assert not Recipe.objects.exists()
+    digest = hashlib.sha256(b"broken").hexdigest()
+    assert not default_storage.exists(
+        f"{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+    )
+
+
+@pytest.mark.django_db
+def test_seed_scale_builds_skewed_dataset():
+    call_command("load_tags", stdout=StringIO())
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f"Ингредиент {i}", measurement_unit="г")
+        for i in range(20)
+    )
+    call_command(
+        "seed_scale", users=200, recipes=100, favorites=1000, carts=40,
+        subscriptions=100, feed=True, workers=1, stdout=StringIO()
+    )
+    assert User.objects.count() == 200
+    assert Recipe.objects.count() == 100
+    assert not Subscription.objects.filter(user=F("author")).exists()
+    favorites = sorted(
+        Recipe.objects.values_list("favorites_count", flat=True),
+        reverse=True
+    )
+    assert sum(favorites) == 1000
+    assert favorites[0] > 5 * sum(favorites) / len(favorites)
+    assert set(reconcile_counters().values()) == {0}
+    assert FeedEntry.objects.exists()
+
+
+@pytest.mark.django_db
+def test_recipe_search_combines_with_filters():
+    _create_recipes(3)
+    lunch = Tag.objects.create(name="Обед", color="#49B64E", slug="lunch")
+    soup = Recipe.objects.get(name="Рецепт 0")
+    soup.name = "Борщ"
+    soup.save()
+    soup.tags.add(lunch)
+    Recipe.objects.filter(name="Рецепт 1").update(text="Подавать как Борщ")
+    beet = Ingredient.objects.create(name="Свёкла", measurement_unit="г")
+    RecipeIngredient.objects.create(
+        recipe=Recipe.objects.get(name="Рецепт 2"), ingredient=beet, amount=1
+    )
+    client = APIClient()
+
+    def names(**params):
+        response = client.get("/api/recipes/", params)
+        assert response.status_code == status.HTTP_200_OK
+        return [recipe["name"] for recipe in response.data["results"]]
+
+    # SQLite сравнивает без учёта регистра только латиницу
+    assert names(search="Борщ") == ["Борщ", "Рецепт 1"]
+    assert names(search="Борщ", tags="lunch") == ["Борщ"]
+    assert names(search="Свёкла") == ["Рецепт 2"]
+    assert names(search="  ") == ["Рецепт 2", "Рецепт 1", "Борщ"]
@@ -0,0 +1,116 @@
+"""
+Приведение единиц измерения для списка покупок.
+
+Количества переводятся в базовые единицы по таблице UnitConversion
+(г, мл, шт.), объём — в граммы для ингредиентов с известной плотностью.
+Пересчёт и суммирование выполняются одним SQL-запросом, в Python
+попадают только итоговые строки.
+"""
+from django.db.models import (
+    Case, CharField, F, FloatField, Sum, Value, When,
+)
+
+from recipes.models import UnitConversion
+
+MASS_UNIT = 'г'
+VOLUME_UNIT = 'мл'
+
+# Базовая единица: (крупная единица, сколько в ней базовых)
+DISPLAY_UNITS = {
+    MASS_UNIT: ('кг', 1000),
+    VOLUME_UNIT: ('л', 1000),
+}
+
+# Плотность, г/мл, для продуктов, которые покупают на вес.
+DEFAULT_DENSITIES = {
+    'какао': 0.45,
+    'крахмал': 0.65,
+    'манная крупа': 0.7,
+    'мед': 1.4,
+    'овсяные хлопья': 0.35,
+    'рис': 0.85,
+    'сахар': 0.8,
+    'сахарная пудра': 0.6,
+    'соль': 1.2,
+}
+
+UNIT_FIELD = 'ingredient__measurement_unit'
+
+
+def _conversion_cases(conversions):
+    factor = Case(
+        *(
+            When(**{UNIT_FIELD: unit}, then=Value(factor))
+            for unit, _, factor in conversions
+        ),
+        default=Value(1.0),
+        output_field=FloatField()
+    )
+    base_unit = Case(
+        *(
+            When(**{UNIT_FIELD: unit}, then=Value(base_unit))
+            for unit, base_unit, _ in conversions
+        ),
+        default=F(UNIT_FIELD),
+        output_field=CharField()
+    )
+    return factor, base_unit
+
+
+def _by_mass(then):
+    """Объём ингредиента с известной плотностью считаем в граммах."""
+    return When(
+        base_unit=VOLUME_UNIT,
+        ingredient__density__isnull=False,
+        then=then
+    )
+
+
+def aggregate_in_base_units(recipe_ingredients):
+    """
+    Суммы по (название ингредиента, базовая единица) для выборки
+    RecipeIngredient: values с ключами name, unit, total.
+    """
+    factor, base_unit = _conversion_cases(list(
+        UnitConversion.objects.values_list('unit', 'base_unit', 'factor')
+    ))
+    return recipe_ingredients.annotate(
+        factor=factor,
+        base_unit=base_unit,
+    ).annotate(
+        unit=Case(
+            _by_mass(Value(MASS_UNIT)),
+            default=F('base_unit'),
+            output_field=CharField()
+        ),
+        base_amount=Case(
+            _by_mass(F('amount') * F('factor') * F('ingredient__density')),
+            default=F('amount') * F('factor'),
+            output_field=FloatField()
+        ),
+    ).values(
+        'unit', name=F('ingredient__name')
+    ).annotate(
+        total=Sum('base_amount')
+    ).order_by('name', 'unit')
+
+
+def display_amount(amount, unit):
+    """Переводит большие количества в кг и л, округляет до сотых."""
+    larger = DISPLAY_UNITS.get(unit)
+    if larger and amount >= larger[1]:
+        unit, amount = larger[0], amount / larger[1]
+    amount = round(amount, 2)
+    if amount == int(amount):
+        amount = int(amount)
+    return amount, unit
+
+
+def apply_default_densities(ingredients):
+    """Проставляет плотность из DEFAULT_DENSITIES, где она не задана."""
+    updated = 0
+    for name, density in DEFAULT_DENSITIES.items():
+        updated += ingredients.filter(
+            name=name, density__isnull=True
+        ).update(density=density)
+    return updated
@@ -0,0 +1,23 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'name', 'status', 'attempts', 'max_attempts', 'run_after',
+        'created_at'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'last_error')
+    readonly_fields = ('locked_at', 'last_error', 'created_at')
+    actions = ('retry',)
+
+    @admin.action(description='Перезапустить')
+    def retry(self, request, queryset):
+        queryset.update(
+            status=Task.PENDING, attempts=0, locked_at=None,
+            run_after=timezone.now()
+        )
@@ -0,0 +1,87 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+)
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tasks.queue import claim, execute, requeue_stale
+
+
+def _execute(pk):
+    try:
+        return execute(pk)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи из очереди tasks.Task'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=settings.TASK_WORKER_CONCURRENCY,
+            help='Сколько задач выполнять одновременно'
+        )
+        parser.add_argument(
+            '--pool', choices=('thread', 'process'), default='thread',
+            help='Потоки или процессы (для задач, нагружающих CPU)'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти'
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        concurrency = options['concurrency']
+        if options['pool'] == 'process':
+            pool = ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup
+            )
+        else:
+            pool = ThreadPoolExecutor(max_workers=concurrency)
+        self.stdout.write(
+            f'Воркер запущен: {options["pool"]} x {concurrency}'
+        )
+        done = failed = 0
+        running = set()
+        try:
+            while not self.stopping:
+                requeue_stale()
+                claimed = claim(concurrency - len(running))
+                running |= {pool.submit(_execute, pk) for pk in claimed}
+                if not running:
+                    if options['once']:
+                        break
+                    connections.close_all()
+                    time.sleep(settings.TASK_POLL_INTERVAL)
+                    continue
+                finished, running = wait(
+                    running, timeout=settings.TASK_POLL_INTERVAL,
+                    return_when=FIRST_COMPLETED
+                )
+                for future in finished:
+                    if future.exception() is None and future.result():
+                        done += 1
+                    else:
+                        failed += 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {done}, с ошибкой: {failed}'
+        ))
+
+    def stop(self, *args):
+        self.stopping = True
@@ -0,0 +1,123 @@
+"""
+Очередь фоновых задач в таблице Task, без внешнего брокера.
+
+Функция-задача помечается декоратором @task и ставится в очередь через
+enqueue(func, *args) после коммита текущей транзакции. Аргументы должны
+сериализоваться в JSON. Выполняет задачи команда run_worker; с
+TASKS_EAGER задачи выполняются сразу в том же процессе (для тестов).
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from tasks.models import Task
+
+logger = logging.getLogger(__name__)
+
+
+def task(func=None, *, max_attempts=None):
+    """Разрешает ставить функцию в очередь; задаёт число попыток."""
+    def register(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts or settings.TASK_MAX_ATTEMPTS
+        return func
+
+    return register(func) if func is not None else register
+
+
+def resolve(name):
+    func = import_string(name)
+    if getattr(func, 'task_name', None) != name:
+        raise ValueError(f'{name} не помечена декоратором @task')
+    return func
+
+
+def enqueue(func, *args, delay=0):
+    """
+    Ставит func(*args) в очередь после коммита транзакции; воркер
+    выполнит её не раньше чем через delay секунд. С TASKS_EAGER задача
+    выполняется сразу, delay не учитывается.
+    """
+    name = getattr(func, 'task_name', None)
+    if name is None:
+        raise ValueError(f'{func!r} не помечена декоратором @task')
+    args = list(args)
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: _run_eager(func, args))
+        return
+    transaction.on_commit(lambda: Task.objects.create(
+        name=name, args=args, max_attempts=func.max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay)
+    ))
+
+
+def _run_eager(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Ошибка задачи %s', func.task_name)
+
+
+def claim(limit):
+    """Забирает до limit готовых задач; возвращает их id."""
+    now = timezone.now()
+    candidates = list(Task.objects.filter(
+        status=Task.PENDING, run_after__lte=now
+    ).values_list('pk', flat=True)[:limit])
+    return [
+        pk for pk in candidates
+        if Task.objects.filter(pk=pk, status=Task.PENDING).update(
+            status=Task.RUNNING, locked_at=now, attempts=F('attempts') + 1
+        )
+    ]
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи упавших воркеров."""
+    deadline = timezone.now() - timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    return Task.objects.filter(
+        status=Task.RUNNING, locked_at__lt=deadline
+    ).update(status=Task.PENDING, locked_at=None)
+
+
+def execute(pk):
+    """
+    Выполняет задачу. Успешная задача удаляется; упавшая планируется
+    повторно с экспоненциальной задержкой, после max_attempts или для
+    неизвестной функции — FAILED.
+    """
+    current = Task.objects.filter(pk=pk, status=Task.RUNNING).first()
+    if current is None:
+        return False
+    try:
+        func = resolve(current.name)
+    except (ImportError, ValueError) as error:
+        Task.objects.filter(pk=pk).update(
+            status=Task.FAILED, locked_at=None, last_error=str(error)
+        )
+        return False
+    try:
+        func(*current.args)
+    except Exception:
+        error = traceback.format_exc()
+        logger.error('Ошибка задачи %s: %s', current.name, error)
+        if current.attempts >= current.max_attempts:
+            changes = {'status': Task.FAILED}
+        else:
+            delay = settings.TASK_RETRY_DELAY * 2 ** (current.attempts - 1)
+            changes = {
+                'status': Task.PENDING,
+                'run_after': timezone.now() + timedelta(seconds=delay),
+            }
+        Task.objects.filter(pk=pk).update(
+            locked_at=None, last_error=error, **changes
+        )
+        return False
+    Task.objects.filter(pk=pk).delete()
+    return True
@@ -0,0 +1,65 @@
+import pytest
+from django.utils import timezone
+
+from tasks.models import Task
+from tasks.queue import claim, enqueue, execute, task
+
+CALLS = []
+
+
+@task
+def remember(value):
+    CALLS.append(value)
+
+
+@task(max_attempts=2)
+def explode():
+    raise RuntimeError('сбой')
+
+
+def run_ready():
+    return [execute(pk) for pk in claim(10)]
+
+
+@pytest.mark.django_db
+def test_enqueue_waits_for_commit_and_worker_runs_task(
+    settings, django_capture_on_commit_callbacks
+):
+    settings.TASKS_EAGER = False
+    CALLS.clear()
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        enqueue(remember, 'да')
+        assert not Task.objects.exists()
+    assert len(callbacks) == 1
+    assert Task.objects.get().args == ['да']
+
+    assert run_ready() == [True]
+    assert CALLS == ['да']
+    assert not Task.objects.exists()
+
+
+@pytest.mark.django_db
+def test_failed_task_is_retried_then_marked_failed(
+    settings, django_capture_on_commit_callbacks
+):
+    settings.TASKS_EAGER = False
+    with django_capture_on_commit_callbacks(execute=True):
+        enqueue(explode)
+
+    assert run_ready() == [False]
+    failed = Task.objects.get()
+    assert failed.status == Task.PENDING
+    assert failed.run_after > timezone.now()
+    assert 'RuntimeError' in failed.last_error
+    assert run_ready() == []
+
+    Task.objects.update(run_after=timezone.now())
+    assert run_ready() == [False]
+    failed.refresh_from_db()
+    assert failed.status == Task.FAILED
+    assert failed.attempts == 2
+
+
+def test_enqueue_requires_task_decorator():
+    with pytest.raises(ValueError):
+        enqueue(print)
@@ -6,9 +6,13 @@ from .models import Subscription, User
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
-    list_display = ('username', 'email', 'first_name', 'last_name')
+    list_display = (
+        'username', 'email', 'first_name', 'last_name',
+        'recipes_count', 'followers_count'
+    )
     search_fields = ('username', 'email')
     list_filter = ('username', 'email')
+    readonly_fields = ('recipes_count', 'followers_count', 'following_count')
 
 
 @admin.register(Subscription)
@@ -1,8 +1,11 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Exists, OuterRef, Value
 
+from foodgram.models import CountersMixin
 
-class User(AbstractUser):
+
+class User(CountersMixin, AbstractUser):
     email = models.EmailField(
         'Email',
         max_length=254,
@@ -22,6 +25,29 @@ class User(AbstractUser):
         null=True,
         blank=True
     )
+    avatar_variants = models.JSONField(
+        'Уменьшенные копии аватара',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        db_index=True
+    )
+    following_count = models.PositiveIntegerField(
+        'Количество подписок',
+        default=0
+    )
+
+    COUNTER_FIELDS = (
+        'recipes_count', 'followers_count', 'following_count'
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -58,3 +84,12 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+def is_subscribed_annotation(user):
+    """Выражение для annotate: подписан ли user на пользователя строки."""
+    if not user.is_authenticated:
+        return Value(False)
+    return Exists(
+        Subscription.objects.filter(user=user, author=OuterRef('pk'))
+    )
@@ -101,7 +101,7 @@ class UserSetPasswordSerializer(serializers.Serializer):
 
     def update(self, instance, validated_data):
         instance.set_password(validated_data['new_password'])
-        instance.save()
+        instance.save(update_fields=['password'])
         return instance
 
 
@@ -153,4 +153,4 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return RecipeMinifiedSerializer(qs, many=True).data
 
     def get_recipes_count(self, obj):
-        return obj.author.recipes.count()
+        return obj.author.recipes_count
@@ -1,8 +1,11 @@
 import pytest
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 
+from recipes.models import Recipe
 from users.models import User
 
 
@@ -33,3 +36,84 @@ def test_user_list_api():
         format='json',
     )
     assert response.status_code == 200
+
+
+def _create_author_with_recipes(index, recipes):
+    author = User.objects.create_user(
+        username=f'author{index}',
+        email=f'author{index}@example.com',
+        password='testpass'
+    )
+    for number in range(recipes):
+        Recipe.objects.create(
+            author=author,
+            name=f'Рецепт {number}',
+            image='recipes/test.jpg',
+            text='Описание',
+            cooking_time=10
+        )
+    return author
+
+
+@pytest.mark.django_db
+def test_subscriptions_query_count_and_recipes_limit():
+    user = User.objects.create_user(
+        username='reader', email='reader@example.com', password='testpass'
+    )
+    for index in range(6):
+        user.follower.create(author=_create_author_with_recipes(index, 4))
+    client = APIClient()
+    client.force_authenticate(user)
+
+    counts = []
+    for limit in (2, 6):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(
+                f'/api/users/subscriptions/?limit={limit}&recipes_limit=2'
+            )
+        assert response.status_code == 200
+        assert len(response.data['results']) == limit
+        counts.append(len(ctx.captured_queries))
+    assert counts[0] == counts[1]
+
+    author = response.data['results'][0]
+    assert author['is_subscribed'] is True
+    assert author['recipes_count'] == 4
+    assert [recipe['name'] for recipe in author['recipes']] == [
+        'Рецепт 3', 'Рецепт 2'
+    ]
+
+    response = client.get('/api/users/subscriptions/?recipes_limit=-1')
+    assert response.status_code == 400
+    response = client.get('/api/users/subscriptions/?recipes_limit=1000')
+    assert len(response.data['results'][0]['recipes']) == 4
+
+
+@pytest.mark.django_db
+def test_subscribe_toggle_is_idempotent():
+    user = User.objects.create_user(
+        username='reader', email='reader@example.com', password='testpass'
+    )
+    author = _create_author_with_recipes(0, 2)
+    client = APIClient()
+    client.force_authenticate(user)
+    url = f'/api/users/{author.pk}/subscribe/'
+
+    response = client.post(url)
+    assert response.status_code == 201
+    assert response.data['is_subscribed'] is True
+    assert response.data['recipes_count'] == 2
+    assert 'recipes' not in response.data
+    assert client.post(url).status_code == 400
+
+    author.refresh_from_db()
+    assert author.followers_count == 1
+    assert user.feed_entries.count() == 2
+
+    response = client.delete(url)
+    assert response.status_code == 200
+    assert response.data['is_subscribed'] is False
+    assert client.delete(url).status_code == 404
+    author.refresh_from_db()
+    assert author.followers_count == 0
+    assert not user.feed_entries.exists()